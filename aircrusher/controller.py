@@ -0,0 +1,803 @@
+"""
+Controller for the automated can crusher.
+
+Nothing here touches hardware until start() (or init_hardware()) is called:
+gpiozero and the i2c drivers are imported and the GPIO devices built there,
+so the logic can be imported by tests, the simulator and other tools.
+
+"""
+import threading
+import os.path
+import os
+from time import sleep, monotonic
+from time import time as ti
+from .journal import StateJournal
+from .telemetry import Telemetry, timed_method
+from .stroke import StrokeTimer
+from .jam import JamRecovery
+from .inputs import InputEdges
+from .keepwarm import KeepWarm
+from .safety import SafetySupervisor, SafetyFault
+
+
+class CrusherController:
+	# BCM pin numbers
+	PINS = {
+		'home': 25,
+		'start': 20,
+		'reset': 16,
+		'load': 8,
+		'retract': 7,
+		'led1': 17,
+		'led2': 21,
+		'disp_sda': 2,
+		'disp_scl': 3,
+		'crusher': 19,
+		'compressor': 13,
+		'safety': 24,
+		# Optional reed switches at the ends of the cylinder, None when not fitted
+		'extended': None,
+		'retracted': None,
+	}
+
+	def __init__(self, pins=None, journal_path='./state.journal', prom_path='./crusher.prom',
+			name='crusher'):
+		self.name = name
+		self.pins = dict(self.PINS)
+		if pins:
+			self.pins.update(pins)
+		# Clock functions; the simulator swaps these for scaled ones
+		self.sleep = sleep
+		self.ti = ti
+		self.monotonic = monotonic
+		self.ts = self.ti()
+		self.lcd_timeout = True
+		self.lcd_status = 'Green'
+		self.lcd_idle_time = 900
+		# Every Button edge, stamped on the GPIO thread
+		self.inputs = InputEdges(self.monotonic)
+		self.button_edges = None
+		self.loader_poll = 0.25	# seconds between interlock checks while the wheel turns
+		self.reed_debounce = 0.002
+		self.start_latency = None
+		self.journal_path = journal_path
+		self.journal = None
+		self.cans = 0
+		self.telemetry = Telemetry(prom_path=prom_path, clock=self.monotonic)
+		self.metrics_port = None	# set to serve the metrics over http as well
+		self.pipeline_mode = True
+		self.vent_time = 0.5
+		self.extend_time = 1
+		self.retract_time = 0.5
+		self.repressurize_time = 2
+		self.can_settle_time = 5
+		# The fixed stroke timings above are worst-case values; with reed switches
+		# fitted they become timeouts and the strokes end on the switch
+		self.crush_dwell = 0.1	# hold at full extension once the switch closes
+		self.extend_stroke = StrokeTimer('extend')
+		self.retract_stroke = StrokeTimer('retract')
+		# Retries, jiggle moves and escalating index timeouts for loader jams
+		self.jam_recovery = JamRecovery()
+		self.ram_retracted = threading.Event()
+		self.ram_retracted.set()
+		# Watches the safety beam between checkpoints and latches the outputs off
+		self.safety = SafetySupervisor(self)
+		self.pressure_target = 90	# psi at which pressurizing ends early
+		# Idle top-ups so a start only needs the short countdown; budgets and
+		# quiet hours are set on the scheduler
+		self.keep_warm_enabled = True
+		self.keep_warm = KeepWarm(self)
+		self.pressure_poll = 0.1
+		# AirSupply shared with other stations, or None when this controller owns
+		# the compressor; strokes then take turns on the air
+		self.air = None
+		self.display = None
+		# Optional tank pressure ADC, probed by open_state(); without it
+		# pressurizing falls back to the time model
+		self.pressure_sensor = None
+		self.hardware_ready = False
+
+	def init_hardware(self, shared=None):
+		# Build the GPIO devices and display; gpiozero and drivers are only imported here.
+		# shared maps led1, led2, start_button, reset_button, compressor and display
+		# to devices built elsewhere, for stations that share them.
+		if self.hardware_ready:
+			return
+		from gpiozero import Button, LED, Motor, DigitalOutputDevice
+		from drivers.display import DisplayService
+		pins = self.pins
+		shared = shared or {}
+		self.led1 = shared['led1'] if 'led1' in shared else LED(pins['led1'])
+		self.led2 = shared['led2'] if 'led2' in shared else LED(pins['led2'])
+		self.home_switch = Button(pins['home'], pull_up=True)
+		self.safe_switch = Button(pins['safety'], pull_up=True)
+		self.inputs.add('home', self.home_switch)
+		self.inputs.add('safety', self.safe_switch)
+		if 'start_button' in shared:
+			# Whoever shares the buttons also reads them
+			self.start_button = shared['start_button']
+			self.reset_button = shared['reset_button']
+		else:
+			self.start_button = Button(pins['start'], pull_up=True)
+			self.reset_button = Button(pins['reset'], pull_up=True)
+			self.inputs.add('start', self.start_button, debounce=0.01)
+			self.inputs.add('reset', self.reset_button, debounce=0.01)
+		# Outputs go through the supervisor, which can switch them off from any thread
+		self.loader = self.safety.guard(Motor(pins['load'], pins['retract']), 'stop')
+		self.crusher = self.safety.guard(
+			DigitalOutputDevice(pins['crusher'], active_high=False, initial_value=False))
+		self.crusher.off()
+		if 'compressor' in shared:
+			self.compressor = self.safety.guard(shared['compressor'])
+		else:
+			self.compressor = self.safety.guard(
+				DigitalOutputDevice(pins['compressor'], active_high=False, initial_value=False))
+		self.compressor.off()
+		self.safety.attach(self.inputs, {'safety': self.safe_switch})
+		self.extended_switch = None
+		self.retracted_switch = None
+		if pins['extended'] is not None:
+			self.extended_switch = Button(pins['extended'], pull_up=True)
+			self.inputs.add('extended', self.extended_switch, debounce=self.reed_debounce)
+			self.extend_stroke.attach(self.inputs, 'extended')
+		if pins['retracted'] is not None:
+			self.retracted_switch = Button(pins['retracted'], pull_up=True)
+			self.inputs.add('retracted', self.retracted_switch, debounce=self.reed_debounce)
+			self.retract_stroke.attach(self.inputs, 'retracted')
+		# The display draws on its own thread so status updates never stall a cycle
+		self.display = shared['display'] if 'display' in shared else DisplayService()
+		self.hardware_ready = True
+
+	def open_state(self):
+		# Journal and optional sensors are opened here rather than in __init__, so
+		# the controller can be built without touching state on disk
+		self.journal = StateJournal(self.journal_path)
+		self.cans = self.journal.state.get('cans', 0)
+		self.extend_stroke.learned = self.journal.state.get('extend_learned')
+		self.retract_stroke.learned = self.journal.state.get('retract_learned')
+		self.jam_recovery.jams = self.journal.state.get('jams', 0)
+		self.jam_recovery.faults = self.journal.state.get('jam_faults', 0)
+		self.safety.faults = self.journal.state.get('safety_faults', 0)
+		self.migrate_time_ini()
+		try:
+			from drivers.pressure import PressureSensor
+			self.pressure_sensor = PressureSensor()
+		except (ImportError, OSError):
+			print('No pressure sensor found, using time model')
+			self.pressure_sensor = None
+		else:
+			readable = self.pressure_sensor.max_readable_psi()
+			if self.pressure_target > readable:
+				print('Pressure target %g psi is above the sensor\'s %.1f psi range; '
+					'pressurizing will always run the full time' % (self.pressure_target, readable))
+
+	def start(self, boot_time=None):
+		# Power-on sequence: safety check, boot pressurize, first homing. Leaves the
+		# buttons bound; call run() to serve them.
+		self.sleep(1.5)
+		self.init_hardware()
+		self.open_state()
+		self.display.start()
+		if self.metrics_port:
+			self.telemetry.serve(self.metrics_port)
+		# A blocked throat, at the safety check or at any point of the boot
+		# sequence, is reported and waits for a reset press
+		try:
+			self.boot(boot_time)
+		except SafetyFault as fault:
+			self.report_fault(fault)
+			self.bind_buttons()
+			return
+		self.telemetry.export()
+		if self.keep_warm_enabled:
+			self.keep_warm.start()
+		# Wait for Start Button
+		self.bind_buttons()
+
+	def boot(self, boot_time=None):
+		# Safety check, boot pressurize and first homing; raises SafetyFault
+		self.is_safe()
+		print("Safety Check Done")
+		# Acknowledge power on
+		self.display.message("Power-On-", "Self-Test")
+		self.sleep(1)
+
+		if boot_time is None:
+			boot_time = self.read_time_stamp()
+
+		self.compressor.on()
+		self.countdown(boot_time)
+		self.compressor.off()
+		self.set_time_stamp()
+
+		# Ensure crusher is retracted at start
+		self.crusher.off()
+
+		# Home the rotor
+		self.display.message("Homing loader", "for first time")
+		self.sleep(2)
+		self.display.message()
+		self.home()
+
+	def run(self):
+		# Serve button presses until stop() is called
+		self.wait_for_buttons()
+
+	def stop(self, *message):
+		# Drive every output to its safe state and release the display and journal.
+		# A message is shown and flashed as an error.
+		self.inputs.post('stop')
+		self.keep_warm.stop()
+		self.safety.stop()
+		if not self.hardware_ready:
+			# Stopped during boot, before there were any outputs to drive
+			return
+		if message:
+			self.display.message(*message)
+		self.loader.stop()
+		self.crusher.off()
+		self.compressor.off()
+		if message:
+			self.blink_error()
+		self.led1.off()
+		self.led2.off()
+		self.display.stop()
+		if self.journal:
+			self.journal.close()
+
+	def switch_test(self):
+		try:
+			while True:
+				if self.start_button.is_pressed:
+					self.display.message('Start Pressed')
+					print("Start Pressed")
+				else:
+					self.display.message('Start released')
+					print("Start released")
+				self.sleep(1)
+				if self.reset_button.is_pressed:
+					self.display.message('Reset Pressed')
+					print("Reset Pressed")
+				else:
+					self.display.message('Reset released')
+					print("Reset released")
+				self.sleep(1)
+				if self.safe_switch.is_pressed:
+					self.display.message('Safe Pressed')
+					print("Safe Pressed")
+				else:
+					self.display.message('Safe released')
+					print("Safe released")
+				self.sleep(1)
+				if self.home_switch.is_pressed:
+					self.display.message('Home Pressed')
+					print("Home Pressed")
+				else:
+					self.display.message('Home released')
+					print("Home released")
+				self.sleep(1)
+		except KeyboardInterrupt:
+			# If there is a KeyboardInterrupt (when you press ctrl+c), exit the program and cleanup
+			print("Cleaning up!")
+			self.display.message('Exiting debug')
+			self.sleep(3)
+			self.display.message()
+
+	def is_safe(self):
+		# Raises SafetyFault if the throat is blocked or the supervisor is still
+		# latched, leaving the outputs safe and the process running
+		if self.safe_switch.is_pressed:
+			print("Rotator is Jammed!")
+			self.safety.trip('safety', 'Rotator Jammed')
+		self.safety.check()
+		self.display.message('Safe to Run')
+		print("Safe to run")
+		return True
+
+	def report_fault(self, fault):
+		# The supervisor has already made the outputs safe; tell the operator
+		print('Safety fault: %s' % fault.reason)
+		self.display.message(fault.reason, 'Clear, then Reset')
+		self.journal.update(safety_faults=self.safety.faults)
+		self.telemetry.gauge('safety_faults', self.safety.faults, 'Safety trips since install')
+		self.telemetry.export()
+		# In the background: stations share the LEDs and may fault together
+		self.blink_error(background=True)
+
+	def clear_fault(self):
+		# Called on an operator button press; False while the fault is still there
+		if not self.safety.tripped:
+			return True
+		if self.safety.reset():
+			print('Safety fault cleared')
+			self.display.message('Fault cleared')
+			return True
+		self.display.message('Still blocked', 'Clear the throat')
+		return False
+
+	def lcd_timer(self):
+		nts = self.ti()
+		time_diff = nts - self.ts
+		if time_diff >= self.lcd_idle_time:
+			return True
+		else:
+			return False
+
+	def lcd_change_color(self, need):
+		if self.lcd_status == need:
+			pass
+		else:
+			self.display.message('Loader ready', need + ' to start')
+			self.lcd_status = need
+			print('lcd_status set to ' + need)
+
+	def lcd_timeout_test(self):
+		self.lcd_timeout = self.lcd_timer()
+		if self.lcd_timeout:
+			self.lcd_change_color('Green')
+		else:
+			self.lcd_change_color('Red')
+
+	@timed_method('home')
+	def home(self):
+		self.is_safe()
+		try:
+			self.led1.on()
+			if self.load_can():
+				# Add pressure check function here later
+				self.compressor.on()
+				self.countdown(self.need_pressure())
+				self.crush_it()
+				self.display.message('Can Found', 'and Crushed!')
+				self.sleep(3)
+				self.compressor.off()
+				self.lcd_timeout_test()
+				self.blink()
+			else:
+				if not self.safe_switch.is_pressed:
+					print('Safe Passed')
+					self.lcd_timeout_test()
+					self.compressor.off()
+					self.blink()
+					return True
+				else:
+					print('Home function timed out')
+					self.display.message('Timeout...')
+					self.blink_error()
+					return False
+		except KeyboardInterrupt:
+			print('Program terminated by KBI')
+			self.led1.off()
+			return False
+		except SafetyFault as fault:
+			self.led1.off()
+			self.report_fault(fault)
+			return False
+
+	@timed_method('load_can')
+	def load_can(self):
+		if self.is_safe():
+			self.sleep(1)
+			self.display.message('Safe passed')
+		# Cans break the safety beam on their way through the throat
+		with self.safety.allow('safety'):
+			return self.index_can()
+
+	def index_can(self):
+		if self.crusher.value:
+			# Interlock: never turn the wheel while the ram is commanded out
+			print('Ram extended, loader held')
+			return False
+		can_there = False
+		can_loaded = False
+		self.display.message()
+		delay = self.ti() + self.jam_recovery.timeout()
+		# Home and can detection react to edges as they arrive; the poll timeout
+		# only paces the interlock and jam checks
+		with self.inputs.listen('home', 'safety') as edges:
+			self.loader.forward()
+			while not self.inputs.is_pressed('home'):
+				edge = edges.get(self.loader_poll)
+				self.safety.check()
+				if self.crusher.value:
+					self.loader.stop()
+					print('Ram extended, loader held')
+					return False
+				if self.ti() > delay:
+					if not self.recover_jam():
+						print('Loader Jammed!')
+						self.display.message('Timeout reached!', 'Loader Jammed!')
+						self.back_off()
+						return False
+					# Edges seen while jiggling are stale; carry on from the current levels
+					edges.clear()
+					delay = self.ti() + self.jam_recovery.timeout()
+					self.loader.forward()
+					continue
+				if edge is None:
+					print('Keep Moving')
+				elif edge.name != 'safety':
+					continue
+				elif edge.pressed:
+					can_there = True
+					print('Can Found')
+					self.display.message('Can Found')
+					if not self.ram_retracted.is_set():
+						# Hold the can at the throat until the ram is back out of the chamber
+						self.loader.stop()
+						held = self.ti()
+						self.ram_retracted.wait()
+						delay += self.ti() - held
+						self.loader.forward()
+				elif can_there:
+					can_loaded = True
+					print('Can Loaded')
+					self.display.message('Can Loaded')
+		recovered = self.jam_recovery.indexed(self.ti())
+		if recovered is not None:
+			print('Jam cleared in %.1fs' % recovered)
+			self.telemetry.record('jam_recovery', recovered)
+		self.telemetry.gauge('loader_jam_rate', self.jam_recovery.jam_rate(),
+			'Fraction of recent loads that jammed')
+		self.unhome()
+		self.sleep(0.25)
+		if can_there and not self.inputs.is_pressed('safety'):
+			can_loaded = True
+			print('Can Loaded')
+			self.display.message('Can Loaded')
+		if can_there and can_loaded:
+			self.cans += 1
+			self.telemetry.count_can()
+			return True
+		else:
+			return False
+
+	def recover_jam(self):
+		# Jiggle the wheel to free a jam; False once the retries are used up
+		self.loader.stop()
+		if not self.jam_recovery.jammed(self.ti()):
+			return False
+		attempt = self.jam_recovery.attempt
+		print('Loader jam, retry %d of %d' % (attempt, self.jam_recovery.retries))
+		self.display.message('Loader jam', 'Retry %d of %d' % (attempt, self.jam_recovery.retries))
+		# Jiggling forward can drop a can, so the ram has to be out of the chamber
+		self.ram_retracted.wait()
+		for i in range(self.jam_recovery.jiggles):
+			self.loader.backward()
+			self.sleep(self.jam_recovery.reverse())
+			self.loader.forward()
+			self.sleep(self.jam_recovery.forward_time)
+		self.loader.stop()
+		return True
+
+	def back_off(self):
+		self.loader.backward()
+		self.sleep(0.5)
+		self.loader.stop()
+
+	def unhome(self):
+		print("unhoming")
+		self.loader.forward()
+		self.inputs.wait_for('home', False)
+		self.loader.stop()
+
+	def f_inch(self, val=0.25):
+		self.loader.forward()
+		self.sleep(val)
+		self.loader.stop()
+
+	def b_inch(self, val=0.25):
+		self.loader.reverse()
+		self.sleep(val)
+		self.loader.stop()
+
+	@timed_method('crush_stroke')
+	def crush_stroke(self):
+		# Vent, extend and command the retract; ram_retracted is set once the ram
+		# is back, by the retracted switch or after retract_time
+		# Never queue for the air with a fault latched
+		self.safety.check()
+		if self.air is not None:
+			self.air.take_stroke(self.name)
+		try:
+			print("Crushing")
+			self.display.message("Crushing!!")
+			self.compressor.off()
+			self.sleep(self.vent_time)
+			self.ram_retracted.clear()
+			self.crusher.on()
+			with self.telemetry.phase('extend'):
+				if self.extend_stroke.wait(self.extend_time, self.sleep, self.monotonic):
+					self.sleep(self.crush_dwell)
+			print("Retracting")
+			self.display.message('', "Retracting!!")
+			self.crusher.off()
+		except BaseException:
+			# A stroke cut short, by a safety trip or anything else, must still hand
+			# the air on and release anyone waiting for the ram
+			self.ram_retracted.set()
+			if self.air is not None:
+				self.air.end_stroke(self.name)
+			raise
+		threading.Thread(target=self.mark_retracted, daemon=True).start()
+
+	def mark_retracted(self):
+		with self.telemetry.phase('retract'):
+			self.retract_stroke.wait(self.retract_time, self.sleep, self.monotonic)
+		self.ram_retracted.set()
+		if self.air is not None:
+			self.air.end_stroke(self.name)
+
+	@timed_method('repressurize')
+	def repressurize(self):
+		self.display.message("Crush Complete")
+		self.compressor.on()
+		self.wait_for_pressure(self.repressurize_time)
+
+	def crush_it(self):
+		self.crush_stroke()
+		self.ram_retracted.wait()
+		self.safety.check()
+		self.repressurize()
+
+	def blink(self):
+		print("blink")
+		self.led1.blink(on_time=0.07, off_time=0.07, n=10, background=False)
+		self.led2.blink(on_time=0.07, off_time=0.07, n=10, background=False)
+
+	def blink_error(self, background=False):
+		print("blink_error")
+		self.led1.blink(on_time=0.5, off_time=0.5, n=3, background=background)
+		self.led2.blink(on_time=0.5, off_time=0.5, n=3, background=background)
+
+	@timed_method('countdown')
+	def countdown(self, n, claim=None):
+		while n>0:
+			print(str(n), 'seconds left')
+			thisMessage = str('Countdown = ' + str(n))
+			self.display.message('Pressurizing....', thisMessage)
+			n = n -1
+			self.safety.check()
+			if self.wait_for_pressure(0.8, claim):
+				print('Target pressure reached')
+				return
+
+	def read_pressure(self):
+		# Tank pressure in psi, or None without a working sensor
+		if self.pressure_sensor is None:
+			return None
+		try:
+			return self.pressure_sensor.read_psi()
+		except OSError:
+			print('Pressure sensor read failed')
+			return None
+
+	def wait_for_pressure(self, seconds, claim=None):
+		# Sleep up to seconds, returning True as soon as pressure_target is reached.
+		# On shared air without a sensor, wait for seconds of compressor time instead
+		if self.pressure_sensor is None:
+			if self.air is not None:
+				self.wait_for_air(seconds, claim or self.name)
+			else:
+				self.sleep(seconds)
+			return False
+		deadline = self.ti() + seconds
+		while True:
+			psi = self.read_pressure()
+			if psi is not None and psi >= self.pressure_target:
+				return True
+			remaining = deadline - self.ti()
+			if remaining <= 0:
+				return False
+			self.safety.check()
+			self.sleep(min(self.pressure_poll, remaining))
+
+	def wait_for_air(self, seconds, claim):
+		# Block until the shared compressor has run seconds for claim, however long
+		# the other stations' strokes keep it off
+		start = self.air.received(claim)
+		while self.air.received(claim) - start < seconds:
+			self.safety.check()
+			self.sleep(self.pressure_poll)
+
+	def need_pressure(self):
+		nts = self.ti()
+		time_diff = nts - self.ts
+		if time_diff >= 2400:
+			print("Time greater than 40 min")
+		elif time_diff <= 420:
+			print("Time less than 7 min")
+		else:
+			print("time_diff = ", str(time_diff))
+			print("Calculating required time...")
+		return self.countdown_for(time_diff)
+
+	def countdown_for(self, time_diff):
+		# Seconds of compressor time to refill the tank after time_diff idle seconds
+		if time_diff >= 2400:
+			return 17
+		elif time_diff <= 420:
+			return 5
+		else:
+			return round(time_diff / 140)
+
+	def set_time_stamp(self):
+		self.ts = self.ti()
+		print('Previous time stamp: ' + str(self.journal.state.get('last_time')))
+		self.journal.update(last_time=self.ts, cans=self.cans,
+			extend_learned=self.extend_stroke.learned,
+			retract_learned=self.retract_stroke.learned,
+			jams=self.jam_recovery.jams, jam_faults=self.jam_recovery.faults)
+		print('New timestamp set: ' + str(self.ts))
+
+	def read_time_stamp(self):
+		time_now = self.ti()
+		last_time = self.journal.state.get('last_time')
+		if last_time is not None:
+			time_diff = time_now - last_time
+			print('Recorded Time Stamp from journal: ' + str(last_time))
+			print('Diff = ' + str(time_diff))
+			if time_diff >= 2400:
+				print("Time greater than 40 min")
+				return 20
+			elif time_diff <= 420:
+				print("Time less than 7 min")
+				return 5
+			else:
+				print("time_diff = ", str(time_diff))
+				print("Calculating required time...")
+				pressure_time_ratio = round(time_diff / 80)
+				return pressure_time_ratio
+		else:
+			time_diff = 20
+			print("No time stamp recorded. Sending default.")
+			print("time_diff default= ", str(time_diff))
+			return time_diff
+
+	def migrate_time_ini(self):
+		# One-off import of the time stamp kept in time.ini before the journal existed
+		file_name = "./time.ini"
+		if 'last_time' in self.journal.state or not os.path.isfile(file_name):
+			return
+		import configparser
+		config_obj = configparser.ConfigParser()
+		config_obj.read(file_name)
+		last_time = float(config_obj["time_stamp"]["last_time"])
+		self.journal.update(last_time=last_time)
+		print('Imported time stamp from time.ini: ' + str(last_time))
+
+	def load_ahead(self):
+		# Index the next can on a worker thread; load_can() holds it at the throat
+		# until ram_retracted is set
+		result = {'loaded': False}
+		def worker():
+			try:
+				result['loaded'] = self.load_can()
+			except SafetyFault:
+				# The cycle thread meets the same fault at its next checkpoint
+				pass
+		loading = threading.Thread(target=worker, daemon=True)
+		loading.start()
+		return loading, result
+
+	def run_pipelined(self):
+		# Loader rotation for can N+1 overlaps the retract, re-pressurize and
+		# settle time of can N; the next stroke waits for both to finish
+		while True:
+			self.crush_stroke()
+			retract = self.retract_stroke.expected(self.retract_time)
+			settled = self.ti() + retract + self.repressurize_time + self.can_settle_time
+			loading, result = self.load_ahead()
+			self.ram_retracted.wait()
+			self.repressurize()
+			loading.join()
+			self.safety.check()
+			if not result['loaded']:
+				return
+			with self.telemetry.phase('settle'):
+				self.sleep(max(0, settled - self.ti()))
+
+	@timed_method('cycle')
+	def runCycler(self):
+		try:
+			# Add pressure check function here later
+			self.compressor.on()
+			self.countdown(self.need_pressure())
+			# A new batch is an operator restart after any loader fault
+			self.jam_recovery.reset()
+			self.led1.on()
+			self.led2.on()
+			if self.pipeline_mode:
+				self.run_pipelined()
+			else:
+				self.crush_it()
+				while self.load_can():
+					self.crush_it()
+					with self.telemetry.phase('settle'):
+						self.sleep(self.can_settle_time)
+		except SafetyFault as fault:
+			# Whatever phase was running has been cut short with the outputs safe
+			self.report_fault(fault)
+		else:
+			self.display.message("No more cans!!", "Reset in 10 sec")
+			self.sleep(5)
+			self.compressor.off()
+		self.set_time_stamp()
+		self.lcd_timeout_test()
+		self.led1.off()
+		self.led2.off()
+		self.telemetry.export()
+
+	def bind_buttons(self):
+		# Start queueing button edges for wait_for_buttons()
+		if self.button_edges is None:
+			self.button_edges = self.inputs.listen('start', 'reset', 'stop')
+
+	def button_event(self, edge):
+		# The old polling loop started a cycle when .value went 0 -> 1 (gpiozero's
+		# when_pressed) and reported that edge as "released"; keep the same mapping.
+		if edge.name == 'stop':
+			return 'stop'
+		colour = 'green' if edge.name == 'start' else 'red'
+		return colour + ('_released' if edge.pressed else '_pressed')
+
+	def idle_timeout(self):
+		# Seconds until lcd_timer() flips the status, or None to sleep until a button edge
+		remaining = self.lcd_idle_time - (self.ti() - self.ts)
+		if remaining > 0:
+			return remaining
+		return None
+
+	def drain_events(self):
+		# Edges that arrived while a cycle was running were never seen by the old loop either
+		self.button_edges.clear()
+
+	def note_latency(self, stamp):
+		self.start_latency = self.monotonic() - stamp
+		print('Button to cycle latency: %.1f ms' % (self.start_latency * 1000))
+
+	def wait_for_buttons(self):
+		while True:
+			self.lcd_timeout_test()
+			edge = self.button_edges.get(self.idle_timeout())
+			if edge is None:
+				continue
+			event, stamp = self.button_event(edge), edge.stamp
+			if event == 'stop':
+				return
+			elif event == 'green_pressed':
+				print("Green pressed")
+				self.display.message('Start pressed!')
+			elif event == 'green_released':
+				print("Green released")
+				self.display.message('Start released!')
+				self.note_latency(stamp)
+				if not self.clear_fault():
+					continue
+				with self.keep_warm.hold():
+					self.runCycler()
+				self.drain_events()
+			elif event == 'red_pressed':
+				print("Red pressed")
+				self.display.message('Reset Pressed')
+			elif event == 'red_released':
+				print("Red released")
+				self.display.message('Reset released')
+				self.note_latency(stamp)
+				if not self.clear_fault():
+					continue
+				with self.keep_warm.hold():
+					try:
+						self.compressor.on()
+						want_pressure = self.need_pressure()
+						if want_pressure < 15:
+							want_pressure = 15
+						self.countdown(want_pressure)
+					except SafetyFault as fault:
+						self.report_fault(fault)
+					else:
+						self.runCycler()
+					self.compressor.off()
+					self.set_time_stamp()
+				self.lcd_timeout_test()
+				self.drain_events()
@@ -0,0 +1,197 @@
+"""
+Timestamped edge capture for the controller's Button inputs.
+
+Every Button is hooked once, through its when_pressed and when_released
+callbacks, and each edge is stamped with the monotonic clock on the GPIO
+callback thread before anything else happens. Edges are then handed to
+whoever is listening:
+
+	with inputs.listen('home', 'safety') as edges:	# blocking consumer
+		edge = edges.get(timeout=0.25)
+	inputs.on_edge(callback, 'start')		# called on the GPIO thread
+	edge = await inputs.listen_async('start').get()	# asyncio consumer
+
+A listener only sees edges that arrive after it was created, so a consumer
+that also needs the current level should listen first and then read
+is_pressed(), which is the debounced level the edges describe.
+
+Debounce is per input. An edge that arrives within `debounce` seconds of the
+last accepted edge on the same input is dropped, and a timer re-reads the pin
+once the debounce time has passed, so a real change that was hidden by the
+bounce is still reported, just late.
+
+"""
+import queue, threading
+from collections import namedtuple
+from time import monotonic
+
+Edge = namedtuple('Edge', 'name pressed stamp')
+
+
+class Listener:
+	def __init__(self, inputs, names):
+		self.inputs = inputs
+		self.names = set(names)
+		self.queue = queue.Queue()
+
+	def put(self, edge):
+		self.queue.put(edge)
+
+	def get(self, timeout=None):
+		# Next edge, or None after timeout seconds of controller time
+		if timeout is not None:
+			timeout = max(0, timeout / self.inputs.time_scale)
+		try:
+			return self.queue.get(timeout=timeout)
+		except queue.Empty:
+			return None
+
+	def clear(self):
+		while True:
+			try:
+				self.queue.get_nowait()
+			except queue.Empty:
+				return
+
+	def close(self):
+		self.inputs.remove(self)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class AsyncListener(Listener):
+	def __init__(self, inputs, names, loop):
+		import asyncio
+		self.inputs = inputs
+		self.names = set(names)
+		self.loop = loop
+		self.queue = asyncio.Queue()
+
+	def put(self, edge):
+		# Edges arrive on the GPIO thread; hand them to the event loop
+		self.loop.call_soon_threadsafe(self.queue.put_nowait, edge)
+
+	async def get(self):
+		return await self.queue.get()
+
+	def clear(self):
+		while not self.queue.empty():
+			self.queue.get_nowait()
+
+
+class CallbackListener:
+	def __init__(self, inputs, names, callback):
+		self.inputs = inputs
+		self.names = set(names)
+		self.callback = callback
+
+	def put(self, edge):
+		self.callback(edge)
+
+	def close(self):
+		self.inputs.remove(self)
+
+
+class InputEdges:
+	def __init__(self, clock=monotonic):
+		self.clock = clock
+		self.time_scale = 1.0	# controller seconds per real second; the simulator runs faster
+		self.buttons = {}
+		self.debounce = {}
+		self.levels = {}
+		self.accepted = {}
+		self.settling = {}
+		self.listeners = []
+		self.lock = threading.Lock()
+
+	def add(self, name, button, debounce=0.0):
+		# Capture the edges of a gpiozero Button as input name
+		self.buttons[name] = button
+		self.debounce[name] = debounce
+		self.levels[name] = bool(button.is_pressed)
+		self.accepted[name] = None
+		self.settling[name] = False
+		button.when_pressed = lambda: self.edge(name, True)
+		button.when_released = lambda: self.edge(name, False)
+
+	def is_pressed(self, name):
+		return self.levels[name]
+
+	def edge(self, name, pressed, stamp=None):
+		if stamp is None:
+			stamp = self.clock()
+		with self.lock:
+			if pressed == self.levels[name]:
+				return
+			last = self.accepted[name]
+			debounce = self.debounce[name]
+			if last is not None and stamp - last < debounce:
+				if not self.settling[name]:
+					self.settling[name] = True
+					delay = (debounce - (stamp - last)) / self.time_scale
+					timer = threading.Timer(delay, self.settle, (name,))
+					timer.daemon = True
+					timer.start()
+				return
+			self.levels[name] = pressed
+			self.accepted[name] = stamp
+			listeners = [l for l in self.listeners if name in l.names]
+		edge = Edge(name, pressed, stamp)
+		for listener in listeners:
+			listener.put(edge)
+
+	def settle(self, name):
+		# Report the level the pin came to rest at once a bounce has died down
+		with self.lock:
+			self.settling[name] = False
+			self.accepted[name] = None
+		self.edge(name, bool(self.buttons[name].is_pressed))
+
+	def post(self, name, pressed=True):
+		# Inject an event that is not a pin, such as a stop request
+		edge = Edge(name, pressed, self.clock())
+		with self.lock:
+			listeners = [l for l in self.listeners if name in l.names]
+		for listener in listeners:
+			listener.put(edge)
+
+	def listen(self, *names):
+		return self.register(Listener(self, names))
+
+	def listen_async(self, *names, loop=None):
+		import asyncio
+		if loop is None:
+			loop = asyncio.get_running_loop()
+		return self.register(AsyncListener(self, names, loop))
+
+	def on_edge(self, callback, *names):
+		return self.register(CallbackListener(self, names, callback))
+
+	def register(self, listener):
+		with self.lock:
+			self.listeners.append(listener)
+		return listener
+
+	def remove(self, listener):
+		with self.lock:
+			if listener in self.listeners:
+				self.listeners.remove(listener)
+
+	def wait_for(self, name, pressed, timeout=None):
+		# Block until input name is at the given level; returns the edge, a
+		# stand-in edge if it already was, or None on timeout
+		with self.listen(name) as edges:
+			if self.levels[name] == pressed:
+				return Edge(name, pressed, self.clock())
+			deadline = None if timeout is None else self.clock() + timeout
+			while True:
+				remaining = None if deadline is None else deadline - self.clock()
+				if remaining is not None and remaining <= 0:
+					return None
+				edge = edges.get(remaining)
+				if edge is not None and edge.pressed == pressed:
+					return edge
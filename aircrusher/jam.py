@@ -0,0 +1,85 @@
+"""
+Loader jam recovery.
+
+A jam is declared when the wheel does not reach the home switch within the
+current index timeout. Each jam moves the recovery one attempt further:
+
+	CLEAR --jam--> RECOVERING (attempt 1..retries) --home reached--> CLEAR
+	                    |
+	                    +--jam on the last attempt--> FAULTED
+
+While recovering, the controller jiggles the wheel (reverse, then forward)
+and retries the index with a longer timeout and longer reverse moves on
+every attempt. Only when `retries` attempts in a row fail does the loader
+fault out and end the batch. Every index is recorded as jammed or clean in
+a sliding window, so the jam rate covers the last `window` loads.
+
+"""
+from collections import deque
+
+CLEAR = 'clear'
+RECOVERING = 'recovering'
+FAULTED = 'faulted'
+
+
+class JamRecovery:
+	def __init__(self, retries=3, jiggles=2, index_timeout=3, escalation=1.5,
+			reverse_time=0.5, forward_time=0.25, window=50):
+		self.retries = retries			# failed attempts before faulting
+		self.jiggles = jiggles			# reverse/forward pairs per attempt
+		self.index_timeout = index_timeout	# seconds allowed to reach home before a jam
+		self.escalation = escalation		# timeout and reverse growth per attempt
+		self.reverse_time = reverse_time
+		self.forward_time = forward_time
+		self.outcomes = deque(maxlen=window)	# True for a load that jammed
+		self.state = CLEAR
+		self.attempt = 0
+		self.jammed_at = None
+		self.jams = 0
+		self.faults = 0
+		self.last_recovery = None
+
+	def timeout(self):
+		# Seconds the current attempt gets to reach home
+		return self.index_timeout * self.escalation ** self.attempt
+
+	def reverse(self):
+		# Seconds to back the wheel off on the current attempt
+		return self.reverse_time * self.escalation ** max(0, self.attempt - 1)
+
+	def jammed(self, now):
+		# Record a jam; returns False once the retries are used up
+		self.jams += 1
+		if self.state == CLEAR:
+			self.jammed_at = now
+			self.outcomes.append(True)
+		if self.attempt >= self.retries:
+			self.state = FAULTED
+			self.faults += 1
+			return False
+		self.attempt += 1
+		self.state = RECOVERING
+		return True
+
+	def indexed(self, now):
+		# The wheel reached home; returns the recovery time if it had jammed
+		recovered = None
+		if self.state == RECOVERING:
+			recovered = now - self.jammed_at
+			self.last_recovery = recovered
+		else:
+			self.outcomes.append(False)
+		self.reset()
+		return recovered
+
+	def reset(self):
+		# Start the next load fresh, after a recovery or an operator restart
+		self.state = CLEAR
+		self.attempt = 0
+		self.jammed_at = None
+
+	def jam_rate(self):
+		# Fraction of the loads in the window that jammed at least once
+		if not self.outcomes:
+			return 0.0
+		return sum(self.outcomes) / len(self.outcomes)
@@ -0,0 +1,98 @@
+"""
+Append-only state journal for the crusher controller.
+
+Every update appends one line holding the complete controller state as JSON,
+prefixed with its CRC32:
+
+	1c291ca3 {"cans":12,"last_time":1700000000.0}
+
+The latest state is therefore the last intact line, which is found by reading
+only the tail of the file. A line torn by a power cut fails its checksum and
+is skipped. Once the file grows past compact_size it is rewritten as a single
+record through a temporary file and an atomic rename.
+
+"""
+import json, os, zlib
+
+TAIL_BLOCK = 4096
+
+
+class StateJournal:
+	def __init__(self, path, compact_size=65536):
+		self.path = path
+		self.compact_size = compact_size
+		self.state = self.read_latest()
+		self.file = open(self.path, 'ab')
+		if self.file.tell() and not self.ends_with_newline():
+			# Terminate a torn last line so the next record starts clean
+			self.file.write(b'\n')
+
+	def ends_with_newline(self):
+		with open(self.path, 'rb') as f:
+			f.seek(-1, os.SEEK_END)
+			return f.read(1) == b'\n'
+
+	def encode(self, state):
+		payload = json.dumps(state, sort_keys=True, separators=(',', ':')).encode()
+		return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+	def decode(self, line):
+		# Returns the state held by one line, or None if it is torn or corrupt
+		crc, _, payload = line.partition(b' ')
+		try:
+			if int(crc, 16) != zlib.crc32(payload):
+				return None
+			return json.loads(payload)
+		except ValueError:
+			return None
+
+	def read_latest(self):
+		try:
+			f = open(self.path, 'rb')
+		except FileNotFoundError:
+			return {}
+		with f:
+			size = f.seek(0, os.SEEK_END)
+			block = min(size, TAIL_BLOCK)
+			while block:
+				f.seek(size - block)
+				lines = f.read(block).split(b'\n')
+				if block < size:
+					# The first line of a partial block may be cut short
+					lines = lines[1:]
+				for line in reversed(lines):
+					state = self.decode(line)
+					if state is not None:
+						return state
+				if block == size:
+					break
+				block = min(size, block * 4)
+		return {}
+
+	def update(self, **changes):
+		# Merge changes into the state and make the new state durable
+		self.state.update(changes)
+		self.file.write(self.encode(self.state))
+		self.file.flush()
+		os.fsync(self.file.fileno())
+		if self.file.tell() > self.compact_size:
+			self.compact()
+
+	def compact(self):
+		tmp = self.path + '.tmp'
+		with open(tmp, 'wb') as f:
+			f.write(self.encode(self.state))
+			f.flush()
+			os.fsync(f.fileno())
+		self.file.close()
+		os.replace(tmp, self.path)
+		# Persist the rename itself
+		dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+		try:
+			os.fsync(dir_fd)
+		finally:
+			os.close(dir_fd)
+		self.file = open(self.path, 'ab')
+
+	def close(self):
+		self.file.close()
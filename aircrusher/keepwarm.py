@@ -0,0 +1,191 @@
+"""
+Compressor keep-warm scheduler for the idle time between batches.
+
+The controller's pressure model is the time since the tank was last known to
+be full (ts): need_pressure() turns that idle time into countdown seconds,
+from 5 s for a tank topped up within 7 minutes up to 17 s after 40 minutes.
+While the controller is idle this thread runs the compressor in short top-ups
+whenever the idle time passes idle_limit, long enough to undo the modelled
+leak-down, and then moves ts forward so the next start gets the short
+countdown. With a pressure sensor a top-up also starts when the tank reads
+below pressure_target - hysteresis and ends as soon as it is back at target.
+
+Every top-up is limited by three budgets:
+
+	duty_cycle	fraction of the last duty_window seconds the compressor may run
+	daily_energy	watt-hours per calendar day, at compressor_watts
+	quiet_hours	(start, end) local hours with no top-ups at all, or None
+
+A batch always wins: hold() stops a running top-up within a fraction of a
+second and keeps the scheduler off the compressor until the batch is done.
+
+"""
+import threading, time
+from collections import deque
+from contextlib import contextmanager
+from .safety import SafetyFault
+
+
+class KeepWarm:
+	def __init__(self, controller, idle_limit=420, max_run=20, min_run=2,
+			duty_cycle=0.25, duty_window=600, daily_energy=150.0,
+			compressor_watts=1100, quiet_hours=(22, 7), hysteresis=10,
+			check_interval=15, slice_time=0.25):
+		self.controller = controller
+		self.idle_limit = idle_limit
+		self.max_run = max_run
+		self.min_run = min_run
+		self.duty_cycle = duty_cycle
+		self.duty_window = duty_window
+		self.daily_energy = daily_energy
+		self.compressor_watts = compressor_watts
+		self.quiet_hours = quiet_hours
+		self.hysteresis = hysteresis
+		self.check_interval = check_interval
+		self.slice_time = slice_time
+		self.runs = deque()		# (start, end) of recent top-ups
+		self.day = None
+		self.energy_today = 0.0	# watt-hours used by top-ups today
+		self.held = 0
+		self.topping_up = False
+		self.running = False
+		self.thread = None
+		self.cond = threading.Condition()
+
+	def start(self):
+		journal = self.controller.journal
+		if journal is not None:
+			self.day = journal.state.get('keep_warm_day')
+			self.energy_today = journal.state.get('keep_warm_wh', 0.0)
+		self.running = True
+		self.thread = threading.Thread(target=self.run, name='keep-warm', daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		with self.cond:
+			self.running = False
+			self.cond.notify_all()
+		if self.thread:
+			self.thread.join()
+
+	@contextmanager
+	def hold(self):
+		# Keep the scheduler off the compressor, ending any top-up first
+		with self.cond:
+			self.held += 1
+			self.cond.notify_all()
+			while self.topping_up:
+				self.cond.wait()
+		try:
+			yield
+		finally:
+			with self.cond:
+				self.held -= 1
+				self.cond.notify_all()
+
+	def run(self):
+		while True:
+			with self.cond:
+				self.cond.wait(self.check_interval)
+				if not self.running:
+					return
+				if self.held:
+					continue
+				seconds = self.plan()
+				if seconds is None:
+					continue
+				self.topping_up = True
+			try:
+				self.top_up(seconds)
+			except SafetyFault:
+				# The supervisor has the compressor; top up again once it is reset
+				pass
+			finally:
+				with self.cond:
+					self.topping_up = False
+					self.cond.notify_all()
+
+	def quiet(self, now):
+		if self.quiet_hours is None:
+			return False
+		start, end = self.quiet_hours
+		hour = time.localtime(now).tm_hour
+		if start <= end:
+			return start <= hour < end
+		return hour >= start or hour < end
+
+	def duty_left(self, now):
+		# Compressor seconds still allowed in the current duty window
+		cutoff = now - self.duty_window
+		while self.runs and self.runs[0][1] < cutoff:
+			self.runs.popleft()
+		used = sum(end - max(start, cutoff) for start, end in self.runs)
+		return self.duty_cycle * self.duty_window - used
+
+	def energy_left(self, now):
+		# Compressor seconds left in today's energy ceiling
+		day = time.strftime('%Y-%m-%d', time.localtime(now))
+		if day != self.day:
+			self.day = day
+			self.energy_today = 0.0
+		return (self.daily_energy - self.energy_today) * 3600 / self.compressor_watts
+
+	def wanted(self, now):
+		# Seconds of compressor time the tank needs, or 0 if it is warm enough
+		c = self.controller
+		idle = now - c.ts
+		psi = c.read_pressure()
+		if psi is not None:
+			if psi < c.pressure_target - self.hysteresis:
+				return c.countdown_for(idle)
+			return 0
+		if idle < self.idle_limit:
+			return 0
+		return c.countdown_for(idle)
+
+	def plan(self):
+		# Length of the top-up to run now, or None
+		now = self.controller.ti()
+		if self.controller.safety.tripped or self.quiet(now):
+			return None
+		seconds = min(self.wanted(now), self.max_run, self.duty_left(now), self.energy_left(now))
+		if seconds < self.min_run:
+			return None
+		return seconds
+
+	def top_up(self, seconds):
+		c = self.controller
+		start = c.ti()
+		needed = c.countdown_for(start - c.ts)
+		print('Keep-warm top-up for %.1fs' % seconds)
+		c.compressor.on()
+		try:
+			with self.cond:
+				deadline = start + seconds
+				while self.running and not self.held and not c.safety.tripped:
+					remaining = deadline - c.ti()
+					if remaining <= 0:
+						break
+					psi = c.read_pressure()
+					if psi is not None and psi >= c.pressure_target:
+						break
+					self.cond.wait(min(self.slice_time, remaining))
+		finally:
+			c.compressor.off()
+		end = c.ti()
+		if c.safety.tripped:
+			# The supervisor switched the compressor off at the trip, so only the
+			# time before it counts
+			end = max(start, min(end, c.safety.tripped_at))
+		ran = end - start
+		self.runs.append((start, end))
+		self.energy_today += ran * self.compressor_watts / 3600
+		c.telemetry.record('keep_warm', ran)
+		c.telemetry.gauge('keep_warm_energy_wh', self.energy_today,
+			'Watt-hours used by keep-warm top-ups today')
+		# Move the pressurized stamp forward by the share of the deficit made up
+		fraction = min(1.0, ran / needed) if needed else 1.0
+		c.ts = end - (end - c.ts) * (1 - fraction)
+		if c.journal is not None:
+			c.journal.update(last_time=c.ts, keep_warm_day=self.day,
+				keep_warm_wh=self.energy_today)
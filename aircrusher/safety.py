@@ -0,0 +1,172 @@
+"""
+Safety supervisor for the crusher.
+
+The safety beam across the loader throat must stay clear except while the
+loader is turning, when cans pass through it. The supervisor watches it all
+the time, not just at the controller's checkpoints:
+
+- every edge of a watched input is handled on the GPIO callback thread, so a
+  beam broken while the controller sleeps in the middle of a stroke is acted
+  on at once.
+- a watchdog thread re-reads the raw pins every `poll` seconds in case an
+  edge was lost.
+- a phase that expects the beam to be broken, the loader turning, wraps
+  itself in allow('safety'). The beam is checked again as soon as the last
+  such phase ends.
+
+A trip switches every guarded output to its safe state (ram retracted,
+loader stopped, compressor off) before anything else, and records how long
+that took from the edge. The supervisor then stays latched. Guarded outputs
+raise SafetyFault instead of switching on, and check() raises it at the
+controller's own checkpoints, so whatever phase was running unwinds back to
+the controller, which reports the fault. reset() clears the latch once the
+inputs are clear again.
+
+"""
+import threading
+from contextlib import contextmanager
+
+
+class SafetyFault(Exception):
+	def __init__(self, reason, name=None, latency=None):
+		Exception.__init__(self, reason)
+		self.reason = reason
+		self.name = name
+		self.latency = latency		# real seconds from the edge to safe outputs
+
+
+class Guarded:
+	# Wraps an output device so it cannot be switched on while the supervisor
+	# is tripped; everything else passes straight through to the device
+	ENERGIZE = ('on', 'forward', 'backward', 'reverse', 'blink', 'toggle')
+
+	def __init__(self, supervisor, device, safe):
+		self.supervisor = supervisor
+		self.device = device
+		self.safe = safe		# name of the method that makes it safe
+
+	def make_safe(self):
+		getattr(self.device, self.safe)()
+
+	def __getattr__(self, name):
+		attr = getattr(self.device, name)
+		if name not in self.ENERGIZE:
+			return attr
+		def energize(*args, **kwargs):
+			# Checked under the trip lock, so an output can never be switched on
+			# after a trip has switched it off
+			with self.supervisor.lock:
+				self.supervisor.check()
+				return attr(*args, **kwargs)
+		return energize
+
+
+class SafetySupervisor:
+	def __init__(self, controller, poll=0.05, reaction_limit=0.01):
+		self.controller = controller
+		self.poll = poll			# controller seconds between watchdog reads
+		self.reaction_limit = reaction_limit	# real seconds allowed from edge to safe outputs
+		self.inputs = None
+		self.buttons = {}
+		self.outputs = []
+		self.allowed = {}
+		self.fault = None
+		self.tripped_at = None		# controller time.time() of the latched trip
+		self.faults = 0
+		self.last_reaction = None
+		self.worst_reaction = None
+		self.lock = threading.RLock()
+		self.listener = None
+		self.running = False
+		self.wake = threading.Event()
+		self.thread = None
+
+	def guard(self, device, safe='off'):
+		guarded = Guarded(self, device, safe)
+		self.outputs.append(guarded)
+		return guarded
+
+	def attach(self, inputs, buttons):
+		# Watch the named Buttons, already added to inputs, and start the watchdog
+		self.inputs = inputs
+		self.buttons = dict(buttons)
+		for name in self.buttons:
+			self.allowed.setdefault(name, 0)
+		self.listener = inputs.on_edge(self.edge, *self.buttons)
+		self.running = True
+		self.thread = threading.Thread(target=self.watch, name='safety', daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		self.wake.set()
+		if self.listener is not None:
+			self.listener.close()
+			self.listener = None
+
+	def edge(self, edge):
+		# Runs on the GPIO callback thread
+		if edge.pressed and not self.allowed[edge.name]:
+			self.trip(edge.name, 'Safety beam broken', edge.stamp)
+
+	def watch(self):
+		while self.running:
+			for name, button in self.buttons.items():
+				if not self.allowed[name] and button.is_pressed:
+					self.trip(name, 'Safety beam broken')
+			self.wake.wait(self.poll / self.inputs.time_scale)
+
+	@contextmanager
+	def allow(self, name):
+		# with supervisor.allow('safety'): a phase in which the input may be active.
+		# Counted, so phases on different threads can overlap
+		with self.lock:
+			self.allowed[name] += 1
+		try:
+			yield
+		finally:
+			with self.lock:
+				self.allowed[name] -= 1
+				if not self.allowed[name] and self.inputs.is_pressed(name):
+					self.trip(name, 'Safety beam broken')
+
+	def trip(self, name, reason, stamp=None):
+		if stamp is None:
+			stamp = self.inputs.clock()
+		with self.lock:
+			for output in self.outputs:
+				output.make_safe()
+			latency = (self.inputs.clock() - stamp) / self.inputs.time_scale
+			if self.fault is not None:
+				return
+			self.fault = SafetyFault(reason, name, latency)
+			self.tripped_at = self.controller.ti()
+			self.faults += 1
+		self.last_reaction = latency
+		if self.worst_reaction is None or latency > self.worst_reaction:
+			self.worst_reaction = latency
+		self.controller.telemetry.record('safety_reaction', latency)
+		print('Safety trip on %s: outputs safe in %.2f ms' % (name, latency * 1000))
+		if latency > self.reaction_limit:
+			print('Safety reaction over the %.1f ms limit' % (self.reaction_limit * 1000))
+
+	@property
+	def tripped(self):
+		return self.fault is not None
+
+	def check(self):
+		# Raise the latched fault, if any. A fresh exception each time, as several
+		# threads may be unwinding from the same trip
+		fault = self.fault
+		if fault is not None:
+			raise SafetyFault(fault.reason, fault.name, fault.latency)
+
+	def reset(self):
+		# Clear the latch once no watched input is active outside an allowed phase;
+		# False if one still is
+		with self.lock:
+			for name in self.buttons:
+				if not self.allowed[name] and self.inputs.is_pressed(name):
+					return False
+			self.fault = None
+			return True
@@ -0,0 +1,275 @@
+"""
+Several crusher stations run from one Pi and one air supply.
+
+Each station is a CrusherController with its own loader, ram, break beams,
+journal and telemetry. The compressor, start/reset buttons, LEDs and display
+belong to the StationGroup and are shared. The air is shared through an
+AirSupply:
+
+- only one station strokes at a time. A stroke holds the air from the vent
+  until the ram is back, and stations queue for their turn in order, so
+  strokes are staggered rather than drawing on the tank together.
+- each station's compressor is a claim on the shared one. The compressor runs
+  while any station wants pressure and no stroke is in progress, so
+  stations pressurize together instead of each waiting out its own
+  countdown.
+- the compressor time is shared out between the claims it ran for, and
+  without a pressure sensor a station's countdown and repressurize wait
+  for that much of its own compressor time rather than a fixed sleep. A
+  station held off the air by the others' strokes waits longer instead of
+  stroking on a tank it never refilled.
+
+"""
+import os, threading
+from collections import deque
+from time import monotonic
+from .controller import CrusherController
+from .inputs import InputEdges
+from .safety import SafetyFault
+
+# Loader, ram and beam pins for up to four stations (BCM). Station 1 is the
+# original single-station wiring. Station 4 uses the last free pins: its valve
+# is on GPIO 4, which has no boot-time function and is pulled up at reset, so
+# the active-low relay stays off. Its loader is on GPIO 0/1, also pulled up,
+# which brakes the motor, and its beams are on the UART pins 14/15. Station 4
+# needs enable_uart=0 in /boot/config.txt so the serial console neither
+# drives TX against the beam nor reads the beam as input.
+STATION_PINS = [
+	{'home': 25, 'safety': 24, 'load': 8, 'retract': 7, 'crusher': 19},
+	{'home': 23, 'safety': 22, 'load': 27, 'retract': 18, 'crusher': 26},
+	{'home': 6, 'safety': 5, 'load': 11, 'retract': 9, 'crusher': 12},
+	{'home': 15, 'safety': 14, 'load': 0, 'retract': 1, 'crusher': 4},
+]
+
+
+class CompressorClaim:
+	# Stands in for the compressor output of one station
+	def __init__(self, air, name):
+		self.air = air
+		self.name = name
+
+	def on(self):
+		self.air.set_claim(self.name, True)
+
+	def off(self):
+		self.air.set_claim(self.name, False)
+
+	@property
+	def value(self):
+		return int(self.name in self.air.claims)
+
+
+class AirSupply:
+	def __init__(self, compressor, clock=monotonic):
+		self.compressor = compressor
+		self.clock = clock
+		self.claims = set()
+		self.waiting = deque()		# stations queued for a stroke
+		self.stroking = None
+		self.supplied = {}		# compressor seconds each claim has received
+		self.running_since = None
+		self.cond = threading.Condition()
+
+	def claim(self, name):
+		return CompressorClaim(self, name)
+
+	def set_claim(self, name, on):
+		with self.cond:
+			self.accrue()
+			if on:
+				self.claims.add(name)
+			else:
+				self.claims.discard(name)
+			self.update()
+
+	def update(self):
+		# Run the compressor for any claim, but never during a stroke
+		self.accrue()
+		if self.claims and self.stroking is None:
+			self.compressor.on()
+			self.running_since = self.clock()
+		else:
+			self.compressor.off()
+			self.running_since = None
+
+	def accrue(self):
+		# Share the compressor time since the last call equally among the claims
+		# it was running for. Called with cond held, before the claims change
+		if self.running_since is None or not self.claims:
+			return
+		now = self.clock()
+		share = (now - self.running_since) / len(self.claims)
+		for name in self.claims:
+			self.supplied[name] = self.supplied.get(name, 0.0) + share
+		self.running_since = now
+
+	def received(self, name):
+		# Compressor seconds claim name has had so far
+		with self.cond:
+			self.accrue()
+			return self.supplied.get(name, 0.0)
+
+	def take_stroke(self, name):
+		# Block until it is this station's turn on the air
+		with self.cond:
+			self.waiting.append(name)
+			while self.stroking is not None or self.waiting[0] != name:
+				self.cond.wait()
+			self.waiting.popleft()
+			self.stroking = name
+			self.update()
+
+	def end_stroke(self, name):
+		with self.cond:
+			if self.stroking == name:
+				self.stroking = None
+			self.update()
+			self.cond.notify_all()
+
+
+class StationGroup:
+	# Shared pins (BCM)
+	PINS = {
+		'start': 20,
+		'reset': 16,
+		'led1': 17,
+		'led2': 21,
+		'compressor': 13,
+	}
+
+	def __init__(self, station_pins=None, pins=None, state_dir='.'):
+		if station_pins is None:
+			station_pins = STATION_PINS[:2]
+		self.pins = dict(self.PINS)
+		if pins:
+			self.pins.update(pins)
+		self.stations = []
+		for n, station in enumerate(station_pins, 1):
+			controller = CrusherController(pins=station, name='station %d' % n,
+				journal_path=os.path.join(state_dir, 'state-%d.journal' % n),
+				prom_path=os.path.join(state_dir, 'crusher-%d.prom' % n))
+			# One tank, so one idle schedule would be needed; stations do not top up
+			controller.keep_warm_enabled = False
+			self.stations.append(controller)
+		self.inputs = InputEdges(monotonic)
+		self.button_edges = None
+		self.air = None
+		self.display = None
+		self.hardware_ready = False
+
+	def init_hardware(self):
+		if self.hardware_ready:
+			return
+		from gpiozero import Button, LED, DigitalOutputDevice
+		from drivers.display import DisplayService
+		pins = self.pins
+		self.led1 = LED(pins['led1'])
+		self.led2 = LED(pins['led2'])
+		self.start_button = Button(pins['start'], pull_up=True)
+		self.reset_button = Button(pins['reset'], pull_up=True)
+		self.inputs.add('start', self.start_button, debounce=0.01)
+		self.inputs.add('reset', self.reset_button, debounce=0.01)
+		self.compressor = DigitalOutputDevice(pins['compressor'], active_high=False, initial_value=False)
+		self.compressor.off()
+		self.air = AirSupply(self.compressor)
+		self.display = DisplayService()
+		for station in self.stations:
+			station.air = self.air
+			station.init_hardware(shared={
+				'led1': self.led1,
+				'led2': self.led2,
+				'start_button': self.start_button,
+				'reset_button': self.reset_button,
+				'compressor': self.air.claim(station.name),
+				'display': self.display,
+			})
+		self.hardware_ready = True
+
+	def start(self, boot_time=None):
+		# Power-on: one boot pressurize for the shared tank, then home every station
+		self.init_hardware()
+		for station in self.stations:
+			station.open_state()
+		self.display.start()
+		for station in self.stations:
+			try:
+				station.is_safe()
+			except SafetyFault as fault:
+				station.report_fault(fault)
+		if boot_time is None:
+			boot_time = self.stations[0].read_time_stamp()
+		self.pressurize(boot_time)
+		for station in self.stations:
+			station.set_time_stamp()
+			station.crusher.off()
+		# A blocked station stays put until the operator clears it and presses a button
+		for station in self.stations:
+			if station.safety.tripped:
+				continue
+			self.display.message('Homing', station.name)
+			station.home()
+		self.button_edges = self.inputs.listen('start', 'reset', 'stop')
+
+	def pressurize(self, seconds):
+		# The countdown runs on a station that is not faulted, as countdown() stops
+		# at a latched fault; with every station faulted there is nothing to fill for
+		ready = [station for station in self.stations if not station.safety.tripped]
+		if not ready:
+			return
+		boot = self.air.claim('group')
+		boot.on()
+		try:
+			ready[0].countdown(seconds, claim='group')
+		except SafetyFault as fault:
+			ready[0].report_fault(fault)
+		finally:
+			boot.off()
+
+	def run_batch(self):
+		# Run every station's cycle at once; the air supply staggers the strokes
+		before = sum(station.cans for station in self.stations)
+		threads = [threading.Thread(target=station.runCycler, name=station.name, daemon=True)
+			for station in self.stations]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		return sum(station.cans for station in self.stations) - before
+
+	def run(self):
+		# Serve the shared buttons until stop() is called
+		while True:
+			edge = self.button_edges.get()
+			if edge.name == 'stop':
+				return
+			if not edge.pressed:
+				continue
+			if not all([station.clear_fault() for station in self.stations]):
+				continue
+			if edge.name == 'reset':
+				self.pressurize(max(15, self.stations[0].need_pressure()))
+			print('Batch crushed %d cans' % self.run_batch())
+			self.button_edges.clear()
+
+	def stop(self, *message):
+		self.inputs.post('stop')
+		for station in self.stations:
+			station.keep_warm.stop()
+			station.safety.stop()
+		if not self.hardware_ready:
+			return
+		for station in self.stations:
+			station.loader.stop()
+			station.crusher.off()
+		for name in [station.name for station in self.stations] + ['group']:
+			self.air.set_claim(name, False)
+		self.compressor.off()
+		if message:
+			self.display.message(*message)
+			self.stations[0].blink_error()
+		self.led1.off()
+		self.led2.off()
+		self.display.stop()
+		for station in self.stations:
+			if station.journal:
+				station.journal.close()
@@ -0,0 +1,70 @@
+"""
+Adaptive timing for the ram stroke.
+
+With a reed switch at each end of the cylinder a stroke ends on the switch's
+edge, as soon as the ram gets where it was sent, and the time it took is
+folded into a moving average. The fixed timings are kept as the timeout for
+every stroke, so sensing can only ever shorten a phase. A switch that is
+stuck, or that misses too many strokes in a row, stops being trusted and the
+fixed timings take over again, which is also how the controller behaves with
+no switches fitted.
+
+"""
+EWMA_ALPHA = 0.2	# weight of the newest stroke in the learned time
+MISS_LIMIT = 3		# strokes in a row without the switch before it is ignored
+
+
+class StrokeTimer:
+	def __init__(self, name, alpha=EWMA_ALPHA, miss_limit=MISS_LIMIT):
+		self.name = name
+		self.alpha = alpha
+		self.miss_limit = miss_limit
+		self.learned = None
+		self.attach(None)
+
+	def attach(self, inputs, switch=None):
+		# Use input switch of an InputEdges for this end of the stroke, or
+		# fixed timing when inputs is None
+		self.inputs = inputs
+		self.switch = switch
+		self.trusted = inputs is not None
+		self.misses = 0
+
+	def expected(self, fixed):
+		# Best guess at how long the next stroke takes
+		if self.trusted and self.learned is not None:
+			return min(self.learned, fixed)
+		return fixed
+
+	def learn(self, seconds):
+		if self.learned is None:
+			self.learned = seconds
+		else:
+			self.learned += self.alpha * (seconds - self.learned)
+
+	def miss(self, reason):
+		self.misses += 1
+		print('%s switch %s (%d in a row)' % (self.name, reason, self.misses))
+		if self.misses >= self.miss_limit:
+			self.trusted = False
+			print('%s switch ignored, using fixed timing' % self.name)
+
+	def wait(self, fixed, sleep, clock):
+		# Block until the switch closes or fixed seconds have passed. Returns True
+		# when the switch ended the stroke.
+		if not self.trusted:
+			sleep(fixed)
+			return False
+		start = clock()
+		if self.inputs.is_pressed(self.switch):
+			# Closed before the ram has moved: stuck or wired to the wrong end
+			self.miss('already closed')
+			sleep(fixed)
+			return False
+		edge = self.inputs.wait_for(self.switch, True, fixed)
+		if edge is None:
+			self.miss('not seen within %.2fs' % fixed)
+			return False
+		self.misses = 0
+		self.learn(edge.stamp - start)
+		return True
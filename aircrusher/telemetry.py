@@ -0,0 +1,145 @@
+"""
+Per-phase timing for the crusher controller.
+
+Phases are timed with the controller's monotonic clock, so simulated runs
+report simulated seconds. The last `window` durations of each phase are
+kept, so recording a sample is an append to a bounded deque. Percentiles are
+only worked out when the metrics are rendered, either into a Prometheus
+textfile (for node_exporter's textfile collector) or from a small HTTP
+endpoint.
+
+"""
+import os, threading
+from collections import deque
+from functools import wraps
+from time import monotonic
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def timed_method(name):
+	# Decorator timing every call of a method as phase name in self.telemetry
+	def decorate(func):
+		@wraps(func)
+		def wrapper(self, *args, **kwargs):
+			with PhaseTimer(self.telemetry, name):
+				return func(self, *args, **kwargs)
+		return wrapper
+	return decorate
+
+
+class PhaseTimer:
+	def __init__(self, telemetry, name):
+		self.telemetry = telemetry
+		self.name = name
+
+	def __enter__(self):
+		self.start = self.telemetry.clock()
+		return self
+
+	def __exit__(self, *exc):
+		self.telemetry.record(self.name, self.telemetry.clock() - self.start)
+
+
+class Telemetry:
+	def __init__(self, window=512, prom_path=None, clock=monotonic):
+		self.window = window
+		self.clock = clock
+		self.prom_path = prom_path
+		self.samples = {}
+		self.counts = {}
+		self.sums = {}
+		self.cans = deque()
+		self.cans_total = 0
+		self.gauges = {}
+		self.lock = threading.Lock()
+
+	def phase(self, name):
+		# with telemetry.phase('settle'): ...
+		return PhaseTimer(self, name)
+
+	def record(self, name, seconds):
+		with self.lock:
+			if name not in self.samples:
+				self.samples[name] = deque(maxlen=self.window)
+				self.counts[name] = 0
+				self.sums[name] = 0.0
+			self.samples[name].append(seconds)
+			self.counts[name] += 1
+			self.sums[name] += seconds
+
+	def gauge(self, name, value, help_text):
+		# Export a single value as crusher_<name>
+		with self.lock:
+			self.gauges[name] = (value, help_text)
+
+	def count_can(self):
+		with self.lock:
+			self.cans.append(self.clock())
+			self.cans_total += 1
+
+	def cans_per_minute(self):
+		cutoff = self.clock() - 60
+		with self.lock:
+			while self.cans and self.cans[0] < cutoff:
+				self.cans.popleft()
+			return len(self.cans)
+
+	def quantiles(self, name):
+		with self.lock:
+			ordered = sorted(self.samples.get(name, ()))
+		if not ordered:
+			return {}
+		return dict((q, ordered[min(len(ordered) - 1, int(q * len(ordered)))]) for q in QUANTILES)
+
+	def render(self):
+		lines = ['# HELP crusher_phase_seconds Duration of each controller phase',
+			'# TYPE crusher_phase_seconds summary']
+		for name in sorted(self.samples):
+			for q, value in sorted(self.quantiles(name).items()):
+				lines.append('crusher_phase_seconds{phase="%s",quantile="%s"} %.6f' % (name, q, value))
+			with self.lock:
+				lines.append('crusher_phase_seconds_sum{phase="%s"} %.6f' % (name, self.sums[name]))
+				lines.append('crusher_phase_seconds_count{phase="%s"} %d' % (name, self.counts[name]))
+		lines += ['# HELP crusher_cans_per_minute Cans loaded in the last 60 seconds',
+			'# TYPE crusher_cans_per_minute gauge',
+			'crusher_cans_per_minute %d' % self.cans_per_minute(),
+			'# HELP crusher_cans_total Cans loaded since start',
+			'# TYPE crusher_cans_total counter',
+			'crusher_cans_total %d' % self.cans_total]
+		with self.lock:
+			gauges = sorted(self.gauges.items())
+		for name, (value, help_text) in gauges:
+			lines += ['# HELP crusher_%s %s' % (name, help_text),
+				'# TYPE crusher_%s gauge' % name,
+				'crusher_%s %g' % (name, value)]
+		return '\n'.join(lines) + '\n'
+
+	def export(self):
+		# Atomically replace the textfile so a scrape never sees half a write
+		if not self.prom_path:
+			return
+		tmp = self.prom_path + '.tmp'
+		with open(tmp, 'w') as f:
+			f.write(self.render())
+		os.replace(tmp, self.prom_path)
+
+	def serve(self, port, host=''):
+		from http.server import BaseHTTPRequestHandler, HTTPServer
+		telemetry = self
+
+		class MetricsHandler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				body = telemetry.render().encode()
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		server = HTTPServer((host, port), MetricsHandler)
+		threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+		return server
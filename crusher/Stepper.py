@@ -2,12 +2,46 @@
 Modified Stepper class made to run 28BYJ-48 Stepper Motor with a ULN2003 motor controller.
 Full rotation variable determined from http://www.jangeox.be/2013/10/stepper-motor-28byj-48_25.html
 """
+import math
 import time
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+
+class HostClock:
+    """The ticks functions of MicroPython's time module, for running Stepper
+    under CPython on the host."""
+
+    def ticks_us(self):
+        return int(time.perf_counter() * 1000000)
+
+    def ticks_ms(self):
+        return int(time.perf_counter() * 1000)
+
+    def ticks_add(self, ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(self, ticks1, ticks2):
+        return ticks1 - ticks2
+
+    def sleep_us(self, us):
+        time.sleep(us / 1000000)
+
 
 class Stepper:
     FULL_ROTATION = 509
 
+    # Half-steps per second. From rest the motor only follows up to its pull-in
+    # rate (set by delay); once turning it is ramped towards its pull-out rate.
+    MAX_SPEED = 900
+    ACCELERATION = 4000  # half-steps per second per second
+
+    # Turns home() will make looking for the ir1 beam before giving up
+    HOME_ROTATIONS = 4
+
     ROTATE = [
         [0, 0, 0, 1],
         [0, 0, 1, 1],
@@ -19,7 +53,8 @@ class Stepper:
         [1, 0, 0, 1],
     ]
     
-    def __init__(self, mode, pin1, pin2, pin3, pin4, led, ir1, delay):
+    def __init__(self, mode, pin1, pin2, pin3, pin4, led, ir1, delay,
+                 max_speed=MAX_SPEED, accel=ACCELERATION, clock=None, log=print):
         self.mode = self.ROTATE
         self.pin1 = pin1
         self.pin2 = pin2
@@ -28,58 +63,182 @@ class Stepper:
         self.led = led
         self.ir1 = ir1
         self.delay = delay  # Recommend 10+ for FULL_STEP, 1 is OK for ROTATE
+        self.max_speed = max_speed
+        self.accel = accel
+        # Anything with MicroPython's ticks_* and sleep_us; the time module itself
+        # on the Pico
+        if clock is None:
+            clock = time if hasattr(time, 'ticks_us') else HostClock()
+        self.clock = clock
+        # Called with status messages; None keeps them quiet where stdout is a link
+        self.log = log
+        self.ramp = self.build_ramp()
+        self.stopped = False
         
         # Initialize all to 0
         self.reset()
         
-    def step(self, count, direction=1):
-        """Rotate count steps. direction = -1 means backwards"""
+    def build_ramp(self):
+        """Precompute the half-step delays, in microseconds, of a constant
+        acceleration from the pull-in rate up to max_speed. Deceleration
+        reads the same ramp backwards."""
+        start = 1000 / self.delay
+        ramp = []
+        speed = start
+        while speed < self.max_speed:
+            ramp.append(int(1000000 / speed))
+            speed = math.sqrt(start * start + 2 * self.accel * len(ramp))
+        ramp.append(int(1000000 / min(speed, self.max_speed)))
+        return ramp
+
+    def steps(self, count, direction=1):
+        """Generator form of step(). Each iteration energises one half-step
+        and yields the microseconds to hold it before the next one. The move
+        ends early, with the coils released, once stop() has been called."""
         if count<0:
             direction = -1
             count = -count
-        for x in range(count):
-            for bit in self.mode[::direction]:
+        phases = self.mode[::direction]
+        total = count * len(phases)
+        last = len(self.ramp) - 1
+        try:
+            for i in range(total):
+                if self.stopped:
+                    return
+                bit = phases[i % len(phases)]
                 self.pin1(bit[0])
                 self.pin2(bit[1])
                 self.pin3(bit[2])
                 self.pin4(bit[3])
-                time.sleep_ms(self.delay)
-        self.reset()
+                # Trapezoid: accelerate, cruise at max_speed, then decelerate to stop
+                yield self.ramp[min(i, total - 1 - i, last)]
+        finally:
+            self.reset()
+
+    def step(self, count, direction=1):
+        """Rotate count steps. direction = -1 means backwards"""
+        self.stopped = False
+        self.drive(self.steps(count, direction))
+
+    async def step_async(self, count, direction=1):
+        """Like step(), but gives other uasyncio tasks the time between
+        half-steps."""
+        self.stopped = False
+        await self.drive_async(self.steps(count, direction))
+
+    def drive(self, moves, deadline=None):
+        """Runs a steps() generator to completion, holding each half-step for
+        the delay it yields. deadline is an optional ticks_ms() time limit."""
+        due = self.clock.ticks_us()
+        for delay in moves:
+            due = self.wait_until(self.clock.ticks_add(due, delay), deadline)
+
+    async def drive_async(self, moves, deadline=None):
+        """drive() for uasyncio: sleeps the whole milliseconds of each delay
+        in the scheduler and only busy-waits the remainder."""
+        due = self.clock.ticks_us()
+        for delay in moves:
+            due = self.clock.ticks_add(due, delay)
+            wait = self.clock.ticks_diff(due, self.clock.ticks_us())
+            await asyncio.sleep(wait // 1000 / 1000 if wait > 0 else 0)
+            due = self.wait_until(due, deadline)
+
+    def wait_until(self, due, deadline=None):
+        # Returns the time the next delay should count from. When running late
+        # the schedule restarts from now, so steps never bunch up.
+        wait = self.clock.ticks_diff(due, self.clock.ticks_us())
+        if wait > 0:
+            self.clock.sleep_us(wait)
+        if deadline is not None and self.clock.ticks_diff(self.clock.ticks_ms(), deadline) > 0:
+            self.stop()
+        now = self.clock.ticks_us()
+        if self.clock.ticks_diff(now, due) > 0:
+            return now
+        return due
+
+    def stop(self):
+        """Ends the current move after the half-step in progress. Safe to call
+        from an interrupt handler."""
+        self.stopped = True
+
+    def ir_edge(self, pin):
+        # Pin.irq handler for the homing beam
+        self.stop()
         
     def angle(self, r, direction=1):
         self.step(int(self.FULL_ROTATION * r / 360), direction)
     
+    def say(self, message):
+        if self.log is not None:
+            self.log(message)
+
     def reset(self):
         # Reset to 0, no holding, these are geared, you can't move them
         self.pin1(0) 
         self.pin2(0) 
         self.pin3(0) 
         self.pin4(0)
+
+    def arm_home(self):
+        # The beam edge stops the move from the pin interrupt, within one half-step
+        self.stopped = False
+        self.led.value(1)
+        self.ir1.irq(handler=self.ir_edge, trigger=self.ir1.IRQ_RISING, hard=True)
+        if self.ir1.value():
+            self.stopped = True
+
+    def finish_home(self):
+        self.ir1.irq(handler=None)
+        self.led.value(0)
+        self.reset()
+        if self.ir1.value():
+            return True
+        self.say('Home function timed out')
+        return False
         
-    def home(self):
-        looptime = time.time()
+    def home(self, timeout=30):
+        """Turn backwards until the ir1 beam is broken, giving up after
+        HOME_ROTATIONS turns or timeout seconds."""
         try:
-            self.led.value(1)
-            # self.angle(5)
-            while not self.ir1.value() and time.time() < looptime + 30:
-                self.step(-2)
-            else:
-                if self.ir1.value():
-                    self.led.value(0)
-                    self.reset()
-                    return True
-                else:
-                    print('Home function timed out')
-                    self.led.value(0)
-                    self.reset()
-                    return False
+            self.arm_home()
+            deadline = self.clock.ticks_add(self.clock.ticks_ms(), timeout * 1000)
+            self.drive(self.steps(-self.FULL_ROTATION * self.HOME_ROTATIONS), deadline)
         except KeyboardInterrupt:
-            print('Program terminated by KBI')
-            self.led.value(0)
-            self.reset()
+            self.say('Program terminated by KBI')
+            self.finish_home()
             return False
+        return self.finish_home()
+
+    async def home_async(self, timeout=30):
+        """uasyncio version of home(), so the controller can run other tasks
+        while the loader turns."""
+        self.arm_home()
+        deadline = self.clock.ticks_add(self.clock.ticks_ms(), timeout * 1000)
+        await self.drive_async(self.steps(-self.FULL_ROTATION * self.HOME_ROTATIONS), deadline)
+        return self.finish_home()
+
+    def index(self, spokes=1, pockets=4, timeout=10):
+        """Turn forwards until the ir1 beam has seen spokes more spokes of a
+        wheel with pockets pockets. Gives up, returning False, if a spoke has
+        not arrived after one and a half pockets of travel or timeout
+        seconds."""
+        pocket = self.FULL_ROTATION // pockets
+        clear = pocket // 4
+        for _ in range(spokes):
+            # Leave the beam of the spoke we are on before watching for the next
+            self.stopped = False
+            self.drive(self.steps(clear))
+            if self.stopped:
+                return False
+            self.arm_home()
+            deadline = self.clock.ticks_add(self.clock.ticks_ms(), timeout * 1000)
+            self.drive(self.steps(pocket * 3 // 2 - clear), deadline)
+            if not self.finish_home():
+                return False
+        return True
 
-def create(pin1, pin2, pin3, pin4, led, ir1, delay=2, mode='ROTATE'):
-    return Stepper(mode, pin1, pin2, pin3, pin4, led, ir1, delay)
+def create(pin1, pin2, pin3, pin4, led, ir1, delay=2, mode='ROTATE',
+           max_speed=Stepper.MAX_SPEED, accel=Stepper.ACCELERATION, clock=None, log=print):
+    return Stepper(mode, pin1, pin2, pin3, pin4, led, ir1, delay, max_speed, accel, clock, log)
 
 
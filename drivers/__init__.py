@@ -1 +1,20 @@
-from .i2c_dev import Lcd, CustomCharacters
+import importlib
+
+# Devices are imported on first use, so "import drivers" does not pull in smbus
+# and RPi.GPIO until one is actually needed
+LAZY_EXPORTS = {
+    'Lcd': 'i2c_dev',
+    'CustomCharacters': 'i2c_dev',
+    'PressureSensor': 'pressure',
+    'DisplayService': 'display',
+    'I2CBus': 'i2c_bus',
+    'get_bus': 'i2c_bus',
+    'GlyphBank': 'glyphs',
+    'PicoLink': 'pico',
+}
+
+
+def __getattr__(name):
+    if name in LAZY_EXPORTS:
+        return getattr(importlib.import_module('.' + LAZY_EXPORTS[name], __name__), name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,166 @@
+import threading
+from textwrap import wrap
+from time import sleep, monotonic
+
+LCD_LINES = 2
+LCD_COLUMNS = 16
+
+
+class DisplayService:
+    # Owns an Lcd on its own thread so callers never wait on the i2c bus. Pending
+    # text is held per line and a newer message for a line replaces one that has
+    # not been drawn yet, so the queue never holds more than one entry per line.
+    # The same thread is the timer for marquees and paged views; a plain message
+    # ends either.
+    def __init__(self, addr=None, lines=LCD_LINES, columns=LCD_COLUMNS, min_interval=0.1):
+        self.addr = addr
+        self.lines = lines
+        self.columns = columns
+        self.min_interval = min_interval
+        self.lcd = None
+        self.pending = {}
+        self.shown = {}
+        self.scroll = None
+        self.paging = None
+        self.unscroll = False
+        self.running = False
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='display', daemon=True)
+        self.thread.start()
+
+    # draw whatever is still pending, then stop the worker
+    def stop(self, timeout=1):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(timeout)
+
+    # queue text for one line (1-based), padded so it overwrites the old text
+    def show(self, text, line):
+        with self.cond:
+            self.end_views()
+            self.pending[line] = text[:self.columns].ljust(self.columns)
+            self.cond.notify()
+
+    # queue a whole screen, blanking the lines that are not given
+    def message(self, *lines):
+        with self.cond:
+            self.end_views()
+            for line in range(1, self.lines + 1):
+                text = lines[line - 1] if line <= len(lines) else ''
+                self.pending[line] = text[:self.columns].ljust(self.columns)
+            self.cond.notify()
+
+    # scroll up to 40 characters per line through the panel. The text is written
+    # to DDRAM once and each frame is a single display shift command, which moves
+    # every line together; after 40 frames the text is back where it started
+    def marquee(self, *lines, interval=0.35):
+        with self.cond:
+            self.end_views()
+            self.pending = {}
+            self.scroll = {'lines': lines, 'interval': interval, 'due': 0.0, 'written': False}
+            self.cond.notify()
+
+    # cycle through screens, each a tuple of lines, showing each for interval
+    # seconds; only the lines that differ from the last page are redrawn
+    def pages(self, screens, interval=2.0):
+        with self.cond:
+            self.end_views()
+            self.paging = {'screens': list(screens), 'interval': interval, 'due': 0.0, 'index': 0}
+            self.cond.notify()
+
+    # split long text on word boundaries into screens for pages()
+    def paginate(self, text):
+        rows = wrap(text, self.columns) or ['']
+        return [tuple(rows[i:i + self.lines]) for i in range(0, len(rows), self.lines)]
+
+    # called with cond held
+    def end_views(self):
+        if self.scroll is not None:
+            self.scroll = None
+            self.unscroll = True
+        self.paging = None
+
+    # seconds until the next marquee frame or page, 0 if one is due, None if idle
+    def frame_wait(self):
+        due = [view['due'] for view in (self.scroll, self.paging) if view is not None]
+        if not due:
+            return None
+        return max(0.0, min(due) - monotonic())
+
+    def run(self):
+        try:
+            # imported here so the service can be created where smbus is missing
+            from .i2c_dev import Lcd
+            self.lcd = Lcd(self.addr)
+        except (ImportError, OSError) as e:
+            print('Display unavailable: {}'.format(e))
+            self.running = False
+            return
+        drawn = 0
+        while True:
+            with self.cond:
+                while self.running and not self.pending and not self.unscroll and self.frame_wait() != 0:
+                    self.cond.wait(self.frame_wait())
+                if not self.pending and not self.running:
+                    return
+                unscroll, self.unscroll = self.unscroll, False
+                scroll = self.scroll
+                page = self.next_page()
+                if page is not None:
+                    self.pending.update(page)
+            if unscroll:
+                # DDRAM still holds the wide lines, so nothing on screen is known
+                self.lcd.lcd_home()
+                self.shown = {}
+            if scroll is not None:
+                self.draw_scroll(scroll)
+                continue
+            # messages arriving during the rate limit gap coalesce into this redraw
+            gap = drawn + self.min_interval - monotonic()
+            if gap > 0:
+                sleep(gap)
+            with self.cond:
+                batch, self.pending = self.pending, {}
+            # changed lines go out as one batch, a block at a time
+            for line in sorted(batch):
+                if self.shown.get(line) != batch[line]:
+                    self.lcd.lcd_queue_string(batch[line], line)
+                    self.shown[line] = batch[line]
+            self.lcd.lcd_flush()
+            drawn = monotonic()
+
+    # the lines of the page that is due, as pending entries, or None. Called with
+    # cond held
+    def next_page(self):
+        paging = self.paging
+        if paging is None or not paging['screens'] or paging['due'] > monotonic():
+            return None
+        screen = paging['screens'][paging['index'] % len(paging['screens'])]
+        if isinstance(screen, str):
+            screen = (screen,)
+        paging['index'] += 1
+        paging['due'] = monotonic() + paging['interval']
+        page = {}
+        for line in range(1, self.lines + 1):
+            text = screen[line - 1] if line <= len(screen) else ''
+            page[line] = text[:self.columns].ljust(self.columns)
+        return page
+
+    def draw_scroll(self, scroll):
+        if not scroll['written']:
+            self.lcd.lcd_home()
+            for line in range(1, self.lines + 1):
+                text = scroll['lines'][line - 1] if line <= len(scroll['lines']) else ''
+                self.lcd.lcd_display_wide(text, line)
+            self.shown = {}
+            scroll['written'] = True
+            scroll['due'] = monotonic() + scroll['interval']
+        elif scroll['due'] <= monotonic():
+            self.lcd.lcd_shift()
+            scroll['due'] += scroll['interval']
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from .i2c_dev import LCD_SETCGRAMADDR, Rs
+
+# the HD44780 has room for 8 user glyphs, codes 0x00 to 0x07
+CGRAM_SLOTS = 8
+
+# bar graph cells, one to five columns filled, for countdowns
+BAR_GLYPHS = {
+    'bar{}'.format(n): ['1' * n + '0' * (5 - n)] * 8 for n in range(1, 6)
+}
+
+# status icons
+STATUS_GLYPHS = {
+    'can': ['01110', '10001', '11111', '10001', '10001', '10001', '11111', '01110'],
+    'ram': ['11111', '11111', '00100', '00100', '00100', '00100', '11111', '11111'],
+    'air': ['00000', '01110', '10101', '10111', '10001', '01110', '00000', '00000'],
+    'jam': ['00100', '00100', '01110', '01110', '11111', '11011', '11111', '00000'],
+    'ok': ['00000', '00001', '00011', '10110', '11100', '01000', '00000', '00000'],
+}
+
+
+# turn 8 rows of "10001" style strings into the 8 CGRAM bytes they stand for
+def compile_glyph(rows):
+    if len(rows) != 8:
+        raise ValueError('a glyph needs 8 rows, got {}'.format(len(rows)))
+    return bytes(int(row, 2) & 0x1F for row in rows)
+
+
+# the glyph bank of an Lcd, created on first use so every user shares it
+def bank_for(lcd):
+    if lcd.glyphs is None:
+        lcd.glyphs = GlyphBank(lcd)
+    return lcd.glyphs
+
+
+class GlyphBank:
+    # Glyphs are compiled to bytes once, when defined. The bank remembers what each
+    # CGRAM slot holds, so a glyph that is already there costs nothing, and uploads
+    # whatever is missing as a single byte stream with one address command per run of
+    # adjacent slots. When all 8 slots are taken the least recently used glyph that
+    # is not wanted right now is evicted. Any text on screen still showing an
+    # evicted glyph changes to the new one, as the LCD draws from CGRAM live.
+    def __init__(self, lcd, slots=CGRAM_SLOTS):
+        self.lcd = lcd
+        self.glyphs = {}
+        self.names = [None] * slots
+        self.contents = [None] * slots
+        self.recent = OrderedDict()
+        self.pending = {}
+
+    # compile and remember a glyph, given as rows or as 8 bytes
+    def define(self, name, glyph):
+        self.glyphs[name] = bytes(glyph) if isinstance(glyph, (bytes, bytearray)) else compile_glyph(glyph)
+
+    # define every glyph of a set such as BAR_GLYPHS
+    def define_set(self, glyphs):
+        for name, rows in glyphs.items():
+            self.define(name, rows)
+
+    # make the named glyphs resident and return their character codes, uploading
+    # only the ones not already in CGRAM
+    def load(self, *names):
+        if len(set(names)) > len(self.names):
+            raise ValueError('only {} glyphs fit in CGRAM'.format(len(self.names)))
+        codes = []
+        for name in names:
+            if name in self.names:
+                slot = self.names.index(name)
+            else:
+                slot = self.free_slot(names)
+                self.place(slot, name)
+            self.recent.pop(slot, None)
+            self.recent[slot] = name
+            codes.append(slot)
+        self.upload()
+        return codes
+
+    # the character for one glyph, loading it if needed
+    def char(self, name):
+        return chr(self.load(name)[0])
+
+    # an empty slot, else the least recently used one whose glyph is not in keep
+    def free_slot(self, keep):
+        for slot, name in enumerate(self.names):
+            if name is None:
+                return slot
+        for slot, name in self.recent.items():
+            if name not in keep:
+                return slot
+        raise ValueError('no CGRAM slot left to evict')
+
+    # put a glyph in a particular slot; the write waits for upload()
+    def place(self, slot, name):
+        glyph = self.glyphs[name]
+        self.names[slot] = name
+        if self.contents[slot] != glyph:
+            self.pending[slot] = glyph
+        else:
+            # a slot moved back to what the LCD already holds needs no upload
+            self.pending.pop(slot, None)
+        self.recent.pop(slot, None)
+        self.recent[slot] = name
+
+    # write the pending slots in one transfer; CGRAM auto-increments, so each run
+    # of adjacent slots needs only its first address
+    def upload(self):
+        if not self.pending:
+            return
+        stream = []
+        last = None
+        for slot in sorted(self.pending):
+            if slot != last:
+                stream += self.lcd.lcd_encode(LCD_SETCGRAMADDR | (slot << 3))
+            for row in self.pending[slot]:
+                stream += self.lcd.lcd_encode(row, Rs)
+            self.contents[slot] = self.pending[slot]
+            last = slot + 1
+        self.pending = {}
+        # the address counter is left in CGRAM; text writes set a DDRAM address first
+        self.lcd.lcd.write_stream(stream)
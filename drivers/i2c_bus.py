@@ -0,0 +1,142 @@
+import json, os, threading
+from contextlib import contextmanager
+from smbus import SMBus
+
+# bus priorities, lower numbers are served first
+SENSOR = 0
+DISPLAY = 1
+PRIORITIES = 2
+
+# largest data payload of a single smbus i2c block transfer
+I2C_BLOCK_MAX = 32
+
+# valid 7-bit device addresses, as scanned by i2cdetect
+ADDRESS_RANGE = range(0x03, 0x78)
+
+# addresses found by I2CBus.find(), remembered across boots
+ADDRESS_CACHE = '/var/tmp/crusher-i2c.json'
+
+buses = {}
+buses_lock = threading.Lock()
+
+
+def load_addresses(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_addresses(path, addresses):
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(addresses, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print('Could not save i2c addresses: {}'.format(e))
+
+
+# the shared manager for an i2c bus number, opened on first use
+def get_bus(number):
+    with buses_lock:
+        if number not in buses:
+            buses[number] = I2CBus(number)
+        return buses[number]
+
+
+class I2CBus:
+    # Owns the one SMBus handle for a bus and hands it out a transaction at a time.
+    # When the bus is released, waiting sensor reads go before display writes, and
+    # a display stream is sent one block per hold. A sensor sample therefore waits
+    # for at most the single block transfer in flight: 33 bytes, about 3.3ms at
+    # 100kHz. A stream holds a lock on its address from first block to last, so
+    # two streams to the same device never interleave mid-command; 33 bytes is
+    # not a whole number of 6 byte LCD characters.
+    def __init__(self, number):
+        self.number = number
+        self.smbus = SMBus(number)
+        self.cond = threading.Condition()
+        self.busy = False
+        self.waiting = [0] * PRIORITIES
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.address_locks = {}
+
+    # with bus.hold(SENSOR) as smbus: ... runs with the bus to itself
+    @contextmanager
+    def hold(self, priority=DISPLAY):
+        with self.cond:
+            self.waiting[priority] += 1
+            while self.busy or any(self.waiting[:priority]):
+                self.cond.wait()
+            self.waiting[priority] -= 1
+            self.busy = True
+        try:
+            yield self.smbus
+        finally:
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+    # the lock that keeps streams to addr whole
+    def address_lock(self, addr):
+        with self.pending_lock:
+            if addr not in self.address_locks:
+                self.address_locks[addr] = threading.Lock()
+            return self.address_locks[addr]
+
+    # write a raw byte stream in as few transactions as possible, taking the bus
+    # separately for each block so higher priority traffic can go in between. The
+    # command byte of each block is sent on the wire like any other, so a PCF8574
+    # latches it as data
+    def write_stream(self, addr, data, priority=DISPLAY):
+        with self.address_lock(addr):
+            for start in range(0, len(data), I2C_BLOCK_MAX + 1):
+                chunk = data[start:start + I2C_BLOCK_MAX + 1]
+                with self.hold(priority) as smbus:
+                    if len(chunk) == 1:
+                        smbus.write_byte(addr, chunk[0])
+                    else:
+                        smbus.write_i2c_block_data(addr, chunk[0], list(chunk[1:]))
+
+    # read a byte from addr, the probe "i2cdetect -r" uses. Unlike a quick write it
+    # cannot change the state of an EEPROM or similar. False if nothing answers
+    def probe(self, addr):
+        with self.hold() as smbus:
+            try:
+                smbus.read_byte(addr)
+                return True
+            except OSError:
+                return False
+
+    # address of the device called name: the cached address if it still answers,
+    # else the first of candidates that does, which is then cached. None if none do
+    def find(self, name, candidates=ADDRESS_RANGE, cache_path=ADDRESS_CACHE):
+        key = '{}:{}'.format(self.number, name)
+        addresses = load_addresses(cache_path)
+        cached = addresses.get(key)
+        if cached is not None and self.probe(cached):
+            return cached
+        for addr in candidates:
+            if addr != cached and self.probe(addr):
+                addresses[key] = addr
+                save_addresses(cache_path, addresses)
+                return addr
+        return None
+
+    # queue a stream for addr; queued streams are joined and sent by flush()
+    def queue_stream(self, addr, data):
+        with self.pending_lock:
+            self.pending.setdefault(addr, bytearray()).extend(data)
+
+    # send everything queued, for one address or all of them
+    def flush(self, addr=None, priority=DISPLAY):
+        with self.pending_lock:
+            if addr is None:
+                batch, self.pending = self.pending, {}
+            else:
+                batch = {addr: self.pending.pop(addr)} if addr in self.pending else {}
+        for addr, data in batch.items():
+            self.write_stream(addr, data, priority)
@@ -1,9 +1,8 @@
-from smbus import SMBus
 from RPi.GPIO import RPI_REVISION
 from time import sleep
-from re import findall, match
-from subprocess import check_output
-from os.path import exists
+import re
+from collections import OrderedDict
+from .i2c_bus import get_bus, ADDRESS_RANGE, SENSOR, DISPLAY
 
 # old and new versions of the RPi have swapped the two i2c buses
 # they can be identified by RPI_REVISION (or check sysfs)
@@ -55,52 +54,110 @@ En = 0b00000100  # Enable bit
 Rw = 0b00000010  # Read/Write bit
 Rs = 0b00000001  # Register select bit
 
+# DDRAM address commands for the start of each line
+LCD_LINES = {1: 0x80, 2: 0xC0, 3: 0x94, 4: 0xD4}
+
+# {0xNN} placeholder for a character code, such as a custom character
+PLACEHOLDER = re.compile(r'\{0[xX]([0-9a-fA-F]{2})\}')
+
+# a placeholder or a {name:width} field, as used in line templates
+TEMPLATE_TOKEN = re.compile(r'\{0[xX]([0-9a-fA-F]{2})\}|\{(\w+):(\d+)\}')
+
+# each line of a two line HD44780 is 40 cells of DDRAM, of which the panel shows
+# a window; shifting the display moves that window
+DDRAM_WIDTH = 40
+
+# encoded lines kept by Lcd.lcd_line_stream()
+STREAM_CACHE_SIZE = 64
+
+# PCF8574 (0x20-0x27) and PCF8574A (0x38-0x3F) backpack addresses, most common first
+LCD_ADDRESSES = [0x27, 0x3F] + list(range(0x20, 0x27)) + list(range(0x38, 0x3F))
+
 class I2CDevice:
-    def __init__(self, addr=0x27, addr_default=None, bus=BUS_NUMBER):
+    # Every device on a bus shares that bus's I2CBus, which serializes access
+    # across threads. priority is SENSOR or DISPLAY and decides who goes first
+    # when both are waiting. Without addr the device is looked for among
+    # candidates, trying the address cached under name first, and addr_default
+    # is used if nothing answers.
+    def __init__(self, addr=0x27, addr_default=None, bus=BUS_NUMBER, priority=DISPLAY,
+                 name='device', candidates=ADDRESS_RANGE):
+        self.bus = get_bus(bus)
+        self.priority = priority
         if not addr:
-            # try autodetect address, else use default if provided
-            try:
-                self.addr = int('0x{}'.format(
-                    findall("[0-9a-z]{2}(?!:)", check_output(['/usr/sbin/i2cdetect', '-y', str(BUS_NUMBER)]).decode())[0]), base=16) \
-                    if exists('/usr/sbin/i2cdetect') else addr_default
-            except:
-                self.addr = addr_default
+            found = self.bus.find(name, candidates)
+            self.addr = found if found is not None else addr_default
         else:
             self.addr = addr
-        self.bus = SMBus(bus)
 
     # write a single command
     def write_cmd(self, cmd):
-        self.bus.write_byte(self.addr, cmd)
+        with self.bus.hold(self.priority) as smbus:
+            smbus.write_byte(self.addr, cmd)
         sleep(0.0001)
 
     # write a command and argument
     def write_cmd_arg(self, cmd, data):
-        self.bus.write_byte_data(self.addr, cmd, data)
+        with self.bus.hold(self.priority) as smbus:
+            smbus.write_byte_data(self.addr, cmd, data)
         sleep(0.0001)
 
     # write a block of data
     def write_block_data(self, cmd, data):
-        self.bus.write_block_data(self.addr, cmd, data)
+        with self.bus.hold(self.priority) as smbus:
+            smbus.write_block_data(self.addr, cmd, data)
+        sleep(0.0001)
+
+    # write a raw i2c block, without the length byte write_block_data sends
+    def write_i2c_block(self, cmd, data):
+        with self.bus.hold(self.priority) as smbus:
+            smbus.write_i2c_block_data(self.addr, cmd, data)
+        sleep(0.0001)
+
+    # write a raw byte stream in as few transactions as possible
+    def write_stream(self, data):
+        self.bus.write_stream(self.addr, data, self.priority)
+        sleep(0.0001)
+
+    # queue a byte stream to go out with the next flush()
+    def queue_stream(self, data):
+        self.bus.queue_stream(self.addr, data)
+
+    # send this device's queued streams as one batch
+    def flush(self):
+        self.bus.flush(self.addr, self.priority)
         sleep(0.0001)
 
     # read a single byte
     def read(self):
-        return self.bus.read_byte(self.addr)
+        with self.bus.hold(self.priority) as smbus:
+            return smbus.read_byte(self.addr)
 
     # read
     def read_data(self, cmd):
-        return self.bus.read_byte_data(self.addr, cmd)
+        with self.bus.hold(self.priority) as smbus:
+            return smbus.read_byte_data(self.addr, cmd)
 
     # read a block of data
     def read_block_data(self, cmd):
-        return self.bus.read_block_data(self.addr, cmd)
+        with self.bus.hold(self.priority) as smbus:
+            return smbus.read_block_data(self.addr, cmd)
+
+    # read a raw i2c block of length bytes
+    def read_i2c_block(self, cmd, length):
+        with self.bus.hold(self.priority) as smbus:
+            return smbus.read_i2c_block_data(self.addr, cmd, length)
 
 
 class Lcd:
     def __init__(self, addr=None):
         self.addr = addr
-        self.lcd = I2CDevice(addr=self.addr, addr_default=0x27)
+        self.lcd = I2CDevice(addr=self.addr, addr_default=0x27, name='lcd', candidates=LCD_ADDRESSES)
+        # CGRAM residency, see glyphs.bank_for()
+        self.glyphs = None
+        # the six byte stream of every character code, so encoding text is a lookup
+        self.char_streams = [bytes(self.lcd_encode(code, Rs)) for code in range(256)]
+        self.line_streams = OrderedDict()
+        self.templates = {}
         self.lcd_write(0x03)
         self.lcd_write(0x03)
         self.lcd_write(0x03)
@@ -127,40 +184,79 @@ class Lcd:
         self.lcd_write_four_bits(mode | (cmd & 0xF0))
         self.lcd_write_four_bits(mode | ((cmd << 4) & 0xF0))
 
+    # encode a command as the same nibble/strobe byte stream lcd_write sends. Each
+    # byte takes ~90us on a 100kHz bus, which covers the E pulse width and the 37us
+    # execution time of everything except clear and home
+    def lcd_encode(self, cmd, mode=0):
+        stream = []
+        for data in (mode | (cmd & 0xF0), mode | ((cmd << 4) & 0xF0)):
+            stream.append(data | LCD_BACKLIGHT)
+            stream.append(data | En | LCD_BACKLIGHT)
+            stream.append((data & ~En) | LCD_BACKLIGHT)
+        return stream
+
+    # encode a string as the byte stream that writes it at the start of line
+    def lcd_encode_string(self, string, line, extended=False):
+        stream = bytearray(self.lcd_encode(LCD_LINES[line])) if line in LCD_LINES else bytearray()
+        streams = self.char_streams
+        for code in (parse_codes(string) if extended else map(ord, string)):
+            stream += streams[code & 0xFF]
+        return bytes(stream)
+
+    # the encoded stream for a line, from a small LRU cache so repeated messages are
+    # only encoded once
+    def lcd_line_stream(self, string, line, extended=False):
+        key = (string, line, extended)
+        stream = self.line_streams.get(key)
+        if stream is None:
+            stream = self.lcd_encode_string(string, line, extended)
+            self.line_streams[key] = stream
+            if len(self.line_streams) > STREAM_CACHE_SIZE:
+                self.line_streams.popitem(last=False)
+        else:
+            self.line_streams.move_to_end(key)
+        return stream
+
     # put string function
     def lcd_display_string(self, string, line):
-        if line == 1:
-            self.lcd_write(0x80)
-        if line == 2:
-            self.lcd_write(0xC0)
-        if line == 3:
-            self.lcd_write(0x94)
-        if line == 4:
-            self.lcd_write(0xD4)
-        for char in string:
-            self.lcd_write(ord(char), Rs)
+        self.lcd.write_stream(self.lcd_line_stream(string, line))
+
+    # queue a string for a line; queued lines go out together with lcd_flush()
+    def lcd_queue_string(self, string, line):
+        self.lcd.queue_stream(self.lcd_line_stream(string, line))
+
+    # a compiled LineTemplate for text on line, built once and then reused
+    def lcd_template(self, text, line):
+        key = (text, line)
+        if key not in self.templates:
+            self.templates[key] = LineTemplate(self, text, line)
+        return self.templates[key]
+
+    def lcd_flush(self):
+        self.lcd.flush()
 
     # put extended string function. Extended string may contain placeholder like {0xFF} for
     # displaying the particular symbol from the symbol table
     def lcd_display_extended_string(self, string, line):
-        if line == 1:
-            self.lcd_write(0x80)
-        if line == 2:
-            self.lcd_write(0xC0)
-        if line == 3:
-            self.lcd_write(0x94)
-        if line == 4:
-            self.lcd_write(0xD4)
-        # Process the string
-        while string:
-            # Trying to find pattern {0xFF} representing a symbol
-            result = match(r'\{0[xX][0-9a-fA-F]{2}\}', string)
-            if result:
-                self.lcd_write(int(result.group(0)[1:-1], 16), Rs)
-                string = string[6:]
-            else:
-                self.lcd_write(ord(string[0]), Rs)
-                string = string[1:]
+        self.lcd.write_stream(self.lcd_line_stream(string, line, extended=True))
+
+    # write a line across all 40 DDRAM cells, padded or cut to fit, ready to be
+    # scrolled through with lcd_shift(). Only lines 1 and 2 have their own DDRAM
+    # row; on 4 line panels lines 3 and 4 are the second halves of rows 1 and 2
+    def lcd_display_wide(self, string, line):
+        self.lcd.write_stream(self.lcd_line_stream(string[:DDRAM_WIDTH].ljust(DDRAM_WIDTH), line))
+
+    # move the visible window one cell along DDRAM, on every line at once. This is
+    # a single command, so a marquee frame costs one 6 byte transfer
+    def lcd_shift(self, right=False):
+        direction = LCD_MOVERIGHT if right else LCD_MOVELEFT
+        self.lcd.write_stream(self.lcd_encode(LCD_CURSORSHIFT | LCD_DISPLAYMOVE | direction))
+
+    # undo any display shift and put the cursor at the top left
+    def lcd_home(self):
+        self.lcd.write_stream(self.lcd_encode(LCD_RETURNHOME))
+        # return home takes 1.52ms to execute
+        sleep(0.002)
 
     # clear lcd and set to home
     def lcd_clear(self):
@@ -175,6 +271,61 @@ class Lcd:
         elif state == 0:
             self.lcd.write_cmd(LCD_NOBACKLIGHT)
 
+# character codes of a string, with each {0xNN} placeholder as the one code it
+# stands for, in a single pass over the string
+def parse_codes(string):
+    codes = []
+    pos = 0
+    for result in PLACEHOLDER.finditer(string):
+        codes.extend(map(ord, string[pos:result.start()]))
+        codes.append(int(result.group(1), 16))
+        pos = result.end()
+    codes.extend(map(ord, string[pos:]))
+    return codes
+
+
+class LineTemplate:
+    # A line of text compiled once into its PCF8574 byte stream. Besides {0xNN}
+    # placeholders the text may hold {name:width} fields; render() patches their
+    # characters into the stream in place, so showing the line again is a few
+    # lookups and one bulk write:
+    #
+    #   countdown = lcd.lcd_template('Countdown = {n:3}', 2)
+    #   countdown.show(n=17)
+    def __init__(self, lcd, text, line):
+        self.lcd = lcd
+        self.fields = {}
+        streams = lcd.char_streams
+        stream = bytearray(lcd.lcd_encode(LCD_LINES[line])) if line in LCD_LINES else bytearray()
+        pos = 0
+        for token in TEMPLATE_TOKEN.finditer(text):
+            for code in map(ord, text[pos:token.start()]):
+                stream += streams[code & 0xFF]
+            if token.group(1):
+                stream += streams[int(token.group(1), 16)]
+            else:
+                width = int(token.group(3))
+                self.fields[token.group(2)] = (len(stream), width)
+                stream += streams[ord(' ')] * width
+            pos = token.end()
+        for code in map(ord, text[pos:]):
+            stream += streams[code & 0xFF]
+        self.stream = stream
+
+    # patch field values into the stream; values are cut or space padded to width
+    def render(self, **values):
+        streams = self.lcd.char_streams
+        for name, value in values.items():
+            offset, width = self.fields[name]
+            for i, char in enumerate(str(value)[:width].ljust(width)):
+                start = offset + 6 * i
+                self.stream[start:start + 6] = streams[ord(char) & 0xFF]
+        return self.stream
+
+    def show(self, **values):
+        self.lcd.lcd.write_stream(self.render(**values))
+
+
 class CustomCharacters:
     def __init__(self, lcd):
         self.lcd = lcd
@@ -251,22 +402,20 @@ class CustomCharacters:
                             "10001",
                             "11111"]
 
-    # load custom character data to CG RAM for later use in extended string. Data for
-    # characters is hold in file custom_characters.txt in the same folder as i2c_dev.py
-    # file. These custom characters can be used in printing of extended string with a
-    # placeholder with desired character codes: 1st - {0x00}, 2nd - {0x01}, 3rd - {0x02},
+    # load custom character data to CG RAM for later use in extended string. These
+    # custom characters can be used in printing of extended string with a placeholder
+    # with desired character codes: 1st - {0x00}, 2nd - {0x01}, 3rd - {0x02},
     # 4th - {0x03}, 5th - {0x04}, 6th - {0x05}, 7th - {0x06} and 8th - {0x07}.
+    # The characters go through the Lcd's glyph bank, so only slots whose bitmap
+    # changed since the last load are written, all in one transfer.
     def load_custom_characters_data(self):
+        from .glyphs import bank_for
         self.chars_list = [self.char_1_data, self.char_2_data, self.char_3_data,
                            self.char_4_data, self.char_5_data, self.char_6_data,
                            self.char_7_data, self.char_8_data]
-
-        # commands to load character adress to RAM srarting from desired base adresses:
-        char_load_cmds = [0x40, 0x48, 0x50, 0x58, 0x60, 0x68, 0x70, 0x78]
+        bank = bank_for(self.lcd)
         for char_num in range(8):
-            # command to start loading data into CG RAM:
-            self.lcd.lcd_write(char_load_cmds[char_num])
-            for line_num in range(8):
-                line = self.chars_list[char_num][line_num]
-                binary_str_cmd = "0b000{0}".format(line)
-                self.lcd.lcd_write(int(binary_str_cmd, 2), Rs)
+            name = 'custom{}'.format(char_num)
+            bank.define(name, self.chars_list[char_num])
+            bank.place(char_num, name)
+        bank.upload()
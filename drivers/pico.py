@@ -0,0 +1,143 @@
+import os, termios, threading, tty
+from time import monotonic
+from pico import link
+
+# the Pico's USB serial port; the GPIO 14/15 UART is not free, as station 4 of
+# aircrusher.stations reads its beams on GPIO 14/15
+PICO_PORT = '/dev/ttyACM0'
+PICO_BAUD = 115200
+
+
+class PicoError(OSError):
+    pass
+
+
+# open a serial port, or either end of a pty, as a raw byte stream
+def open_port(path, baud=PICO_BAUD):
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+    tty.setraw(fd)
+    attrs = termios.tcgetattr(fd)
+    speed = getattr(termios, 'B{}'.format(baud))
+    attrs[4] = attrs[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    return fd
+
+
+class PicoLink:
+    # Client for the firmware in pico/main.py. Requests carry a sequence number and
+    # a reader thread hands each reply to the caller waiting for that number, so
+    # display and sensor requests from other threads can go out while a loader
+    # move is still waiting for its reply. A request lost to line noise is sent
+    # again, except for moves, which would be made twice if only the reply was lost.
+    def __init__(self, port=PICO_PORT, baud=PICO_BAUD, timeout=0.5, retries=2):
+        self.port = port
+        self.fd = open_port(port, baud)
+        self.timeout = timeout
+        self.retries = retries
+        self.reader = link.FrameReader()
+        self.replies = {}
+        self.outstanding = set()
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.seq = 0
+        self.retried = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.read_loop, name='pico', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        os.close(self.fd)
+        self.thread.join(1)
+
+    def read_loop(self):
+        while self.running:
+            try:
+                data = os.read(self.fd, 256)
+            except OSError:
+                data = b''
+            if not data:
+                break
+            with self.cond:
+                for seq, command, payload in self.reader.feed(data):
+                    if command & link.REPLY and payload:
+                        self.replies[seq] = (command & ~link.REPLY, payload[0], payload[1:])
+                self.cond.notify_all()
+
+    # send one request and wait for its reply; returns (status, payload)
+    def request(self, command, payload=b'', timeout=None, retries=None):
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            with self.cond:
+                # a long move keeps its number, so skip it when the count wraps
+                self.seq = (self.seq + 1) & 0xFF
+                while self.seq in self.outstanding:
+                    self.seq = (self.seq + 1) & 0xFF
+                seq = self.seq
+                self.outstanding.add(seq)
+                self.replies.pop(seq, None)
+            with self.write_lock:
+                os.write(self.fd, link.encode(seq, command, payload))
+            deadline = monotonic() + timeout
+            with self.cond:
+                while seq not in self.replies:
+                    left = deadline - monotonic()
+                    if left <= 0 or not self.running:
+                        break
+                    self.cond.wait(left)
+                reply = self.replies.pop(seq, None)
+                self.outstanding.discard(seq)
+            if reply is not None and reply[0] == command:
+                status, data = reply[1], reply[2]
+                if status == link.BAD_COMMAND or status == link.BAD_PAYLOAD:
+                    raise PicoError('Pico rejected command 0x{:02x} ({})'.format(command, status))
+                return status, data
+            if attempt < retries:
+                self.retried += 1
+        raise TimeoutError('No reply from the Pico on {} to command 0x{:02x}'.format(self.port, command))
+
+    # round trip time in seconds
+    def ping(self):
+        start = monotonic()
+        self.request(link.PING)
+        return monotonic() - start
+
+    # turn the loader wheel on by spokes pockets; False if a spoke never arrived
+    def index(self, spokes=1, timeout=10):
+        status, _ = self.request(link.INDEX, link.struct.pack('<b', spokes),
+                                 timeout=spokes * timeout + self.timeout, retries=0)
+        return self.move_done(status)
+
+    def step(self, count, timeout=30):
+        status, _ = self.request(link.STEP, link.struct.pack('<h', count),
+                                 timeout=timeout, retries=0)
+        return self.move_done(status)
+
+    def home(self, timeout=30):
+        status, _ = self.request(link.HOME, bytes((timeout,)),
+                                 timeout=timeout + self.timeout, retries=0)
+        return self.move_done(status)
+
+    def move_done(self, status):
+        if status == link.BUSY:
+            raise PicoError('Pico is already moving the loader')
+        return status == link.OK
+
+    def stop(self):
+        self.request(link.STOP)
+
+    # write text on one line (1-based, like Lcd.lcd_display_string)
+    def show(self, text, line):
+        self.request(link.SHOW, bytes((line - 1,)) + text.encode())
+
+    # store a screen on the Pico so screen(number) can show it in one short frame
+    def define_screen(self, number, *lines):
+        self.request(link.DEFINE_SCREEN, bytes((number,)) + '\n'.join(lines).encode())
+
+    def screen(self, number):
+        self.request(link.SCREEN, bytes((number,)))
+
+    # {'beam': bool, 'moving': bool, 'pressure': raw 16-bit ADC reading}
+    def sensors(self):
+        return link.unpack_sensors(self.request(link.SENSORS)[1])
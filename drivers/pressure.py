@@ -0,0 +1,66 @@
+from time import sleep
+from .i2c_dev import I2CDevice, SENSOR
+
+# ADS1115 default address (ADDR pin tied to GND)
+ADS1115_ADDRESS = 0x48
+
+# registers
+ADS1115_CONVERSION = 0x00
+ADS1115_CONFIG = 0x01
+
+# config register flags
+ADS1115_OS_SINGLE = 0x8000     # start a single conversion
+ADS1115_MUX_SINGLE = 0x4000    # AINx against GND, x is added in bits 12-13
+ADS1115_PGA_4_096V = 0x0200    # +/-4.096V full scale
+ADS1115_MODE_SINGLE = 0x0100   # power down between conversions
+ADS1115_DR_860SPS = 0x00E0     # fastest data rate, ~1.2 ms per conversion
+ADS1115_COMP_DISABLE = 0x0003
+
+ADS1115_FULL_SCALE = 4.096
+
+# A 0.5-4.5V transducer on 5V, through a 10k/20k divider: 0.33-3.0V at the ADC
+# pin, inside both the 4.096V full scale and the ADS1115's VDD + 0.3V input
+# limit on the Pi's 3.3V
+DIVIDER = 2 / 3
+SENSOR_V_MIN = 0.5 * DIVIDER
+SENSOR_V_MAX = 4.5 * DIVIDER
+
+
+class PressureSensor:
+    # Ratiometric pressure transducer read through an ADS1115 on the LCD's i2c bus.
+    # v_min and v_max are the voltages seen at the ADC pin at 0 and max_psi, so set
+    # them to match any divider used to bring a 5V sensor into the ADC's range.
+    def __init__(self, addr=ADS1115_ADDRESS, channel=0, v_min=SENSOR_V_MIN, v_max=SENSOR_V_MAX,
+                 max_psi=100):
+        self.channel = channel
+        self.v_min = v_min
+        self.v_max = v_max
+        self.max_psi = max_psi
+        # sensor reads go ahead of display traffic on the shared bus
+        self.adc = I2CDevice(addr=addr, priority=SENSOR)
+        # probe the config register so a missing ADC raises OSError here, not mid-cycle
+        self.adc.read_i2c_block(ADS1115_CONFIG, 2)
+
+    # run a single conversion and return the input voltage
+    def read_voltage(self):
+        config = (ADS1115_OS_SINGLE | ADS1115_MUX_SINGLE | (self.channel << 12) |
+                  ADS1115_PGA_4_096V | ADS1115_MODE_SINGLE | ADS1115_DR_860SPS |
+                  ADS1115_COMP_DISABLE)
+        self.adc.write_i2c_block(ADS1115_CONFIG, [config >> 8, config & 0xFF])
+        sleep(0.002)
+        high, low = self.adc.read_i2c_block(ADS1115_CONVERSION, 2)
+        raw = (high << 8) | low
+        if raw & 0x8000:
+            raw -= 1 << 16
+        return raw * ADS1115_FULL_SCALE / 32768
+
+    # tank pressure in psi
+    def read_psi(self):
+        return self.psi(self.read_voltage())
+
+    def psi(self, volts):
+        return max(0.0, (volts - self.v_min) / (self.v_max - self.v_min) * self.max_psi)
+
+    # the highest pressure a reading can show, where the ADC reaches full scale
+    def max_readable_psi(self):
+        return self.psi(ADS1115_FULL_SCALE)
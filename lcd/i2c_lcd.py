@@ -12,14 +12,29 @@ MASK_E  = 0x04       # P2
 SHIFT_BACKLIGHT = 3  # P3
 SHIFT_DATA      = 4  # P4-P7
 
+# garbage collection policies
+GC_PER_WRITE = 0     # collect after every byte (the original behaviour)
+GC_FLUSH = 1         # collect once per putstr() or flush()
+GC_THRESHOLD = 2     # leave it to the allocator via gc.threshold()
+
 class I2cLcd(LcdApi):
     
     #Implements a HD44780 character LCD connected via PCF8574 on I2C
 
-    def __init__(self, i2c, i2c_addr, num_lines, num_columns):
+    def __init__(self, i2c, i2c_addr, num_lines, num_columns,
+                 gc_policy=GC_FLUSH, gc_threshold=4096):
         self.i2c = i2c
         self.i2c_addr = i2c_addr
-        self.i2c.writeto(self.i2c_addr, bytes([0]))
+        self.gc_policy = gc_policy
+        # Preallocated write buffers, so the HAL never allocates after init
+        self.buf = bytearray(4)
+        mv = memoryview(self.buf)
+        self.buf1 = mv[:1]
+        self.buf2 = mv[:2]
+        if gc_policy == GC_THRESHOLD:
+            gc.threshold(gc_threshold)
+        self.buf[0] = 0
+        self.i2c.writeto(self.i2c_addr, self.buf1)
         utime.sleep_ms(20)   # Allow LCD time to powerup
         # Send reset 3 times
         self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
@@ -38,49 +53,56 @@ class I2cLcd(LcdApi):
         self.hal_write_command(cmd)
         gc.collect()
 
+    def putstr(self, string):
+        LcdApi.putstr(self, string)
+        if self.gc_policy == GC_FLUSH and not self.buffered:
+            gc.collect()
+
+    def flush(self):
+        LcdApi.flush(self)
+        if self.gc_policy == GC_FLUSH:
+            gc.collect()
+
     def hal_write_init_nibble(self, nibble):
         # Writes an initialization nibble to the LCD.
         # This particular function is only used during initialization.
         byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
+        self.buf[0] = byte | MASK_E
+        self.buf[1] = byte
+        self.i2c.writeto(self.i2c_addr, self.buf2)
         
     def hal_backlight_on(self):
         # Allows the hal layer to turn the backlight on
-        self.i2c.writeto(self.i2c_addr, bytes([1 << SHIFT_BACKLIGHT]))
-        gc.collect()
+        self.buf[0] = 1 << SHIFT_BACKLIGHT
+        self.i2c.writeto(self.i2c_addr, self.buf1)
         
     def hal_backlight_off(self):
         #Allows the hal layer to turn the backlight off
-        self.i2c.writeto(self.i2c_addr, bytes([0]))
-        gc.collect()
+        self.buf[0] = 0
+        self.i2c.writeto(self.i2c_addr, self.buf1)
         
     def hal_write_command(self, cmd):
         # Write a command to the LCD. Data is latched on the falling edge of E.
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                (((cmd >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                ((cmd & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        self.hal_write_byte(cmd, 0)
         if cmd <= 3:
             # The home and clear commands require a worst case delay of 4.1 msec
             utime.sleep_ms(5)
-        gc.collect()
 
     def hal_write_data(self, data):
         # Write data to the LCD. Data is latched on the falling edge of E.
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                (((data >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                ((data & 0x0f) << SHIFT_DATA))      
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
\ No newline at end of file
+        self.hal_write_byte(data, MASK_RS)
+
+    def hal_write_byte(self, value, rs):
+        # Both nibbles and their E strobes go out in one 4 byte writeto; the
+        # PCF8574 latches each byte in turn, so E still falls after each nibble.
+        base = rs | (self.backlight << SHIFT_BACKLIGHT)
+        high = base | (((value >> 4) & 0x0f) << SHIFT_DATA)
+        low = base | ((value & 0x0f) << SHIFT_DATA)
+        buf = self.buf
+        buf[0] = high | MASK_E
+        buf[1] = high
+        buf[2] = low | MASK_E
+        buf[3] = low
+        self.i2c.writeto(self.i2c_addr, buf)
+        if self.gc_policy == GC_PER_WRITE:
+            gc.collect()
@@ -58,6 +58,10 @@ class LcdApi:
         self.cursor_y = 0
         self.implied_newline = False
         self.backlight = True
+        # shadow holds what the caller has written, screen what the LCD shows
+        self.buffered = False
+        self.shadow = bytearray(b' ' * (self.num_lines * self.num_columns))
+        self.screen = bytearray(self.shadow)
         self.display_off()
         self.backlight_on()
         self.clear()
@@ -68,11 +72,19 @@ class LcdApi:
     def clear(self):
         """Clears the LCD display and moves the cursor to the top left
         corner.
+
+        In buffered mode only the shadow buffer is blanked, and the next
+        flush() rewrites just the cells that were not already blank.
         """
-        self.hal_write_command(self.LCD_CLR)
-        self.hal_write_command(self.LCD_HOME)
+        for i in range(len(self.shadow)):
+            self.shadow[i] = 0x20
         self.cursor_x = 0
         self.cursor_y = 0
+        if self.buffered:
+            return
+        self.hal_write_command(self.LCD_CLR)
+        self.hal_write_command(self.LCD_HOME)
+        self.screen[:] = self.shadow
 
     def show_cursor(self):
         """Causes the cursor to be made visible."""
@@ -119,18 +131,84 @@ class LcdApi:
         self.backlight = False
         self.hal_backlight_off()
 
-    def move_to(self, cursor_x, cursor_y):
-        """Moves the cursor position to the indicated position. The cursor
-        position is zero based (i.e. cursor_x == 0 indicates first column).
+    def set_buffered(self, buffered):
+        """Turns buffered mode on or off. While buffered, putstr, putchar,
+        move_to and clear only update the shadow buffer, and nothing reaches
+        the LCD until flush() is called.
         """
-        self.cursor_x = cursor_x
-        self.cursor_y = cursor_y
+        if self.buffered and not buffered:
+            self.flush()
+        self.buffered = buffered
+        if not buffered:
+            self.move_to(self.cursor_x, self.cursor_y)
+
+    def flush(self):
+        """Writes the cells that changed since the last flush to the LCD.
+        Each run of consecutive changed cells on a line costs one DDRAM
+        address command, after which the LCD's auto-increment does the rest.
+        """
+        cols = self.num_columns
+        for y in range(self.num_lines):
+            row = y * cols
+            x = 0
+            while x < cols:
+                if self.shadow[row + x] == self.screen[row + x]:
+                    x += 1
+                    continue
+                self.hal_write_command(self.LCD_DDRAM | self.ddram_address(x, y))
+                while x < cols and self.shadow[row + x] != self.screen[row + x]:
+                    self.hal_write_data(self.shadow[row + x])
+                    self.screen[row + x] = self.shadow[row + x]
+                    x += 1
+
+    def home(self):
+        """Undoes any display shift and moves the cursor to the top left
+        corner, without clearing the display.
+        """
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self.hal_write_command(self.LCD_HOME)
+        self.hal_sleep_us(1600)
+
+    def put_wide(self, line, string):
+        """Writes string across the whole 40 cell DDRAM row of line (0 or 1),
+        padded or cut to fit, bypassing the shadow buffer. Call home() first,
+        then shift_display() scrolls the text one cell per command. On four
+        line panels lines 2 and 3 share these rows.
+        """
+        self.hal_write_command(self.LCD_DDRAM | (0x40 if line & 1 else 0))
+        for i in range(40):
+            self.hal_write_data(ord(string[i]) if i < len(string) else 0x20)
+        row = (line & 1) * self.num_columns
+        for x in range(self.num_columns):
+            self.screen[row + x] = self.shadow[row + x] = ord(string[x]) if x < len(string) else 0x20
+        self.move_to(self.cursor_x, self.cursor_y)
+
+    def shift_display(self, right=False):
+        """Moves the visible window one cell along DDRAM on every line, so
+        text written with put_wide() scrolls for the cost of one command.
+        """
+        self.hal_write_command(self.LCD_MOVE | self.LCD_MOVE_DISP |
+                               (self.LCD_MOVE_RIGHT if right else 0))
+
+    def ddram_address(self, cursor_x, cursor_y):
+        """Returns the DDRAM address of the indicated cursor position."""
         addr = cursor_x & 0x3f
         if cursor_y & 1:
             addr += 0x40    # Lines 1 & 3 add 0x40
         if cursor_y & 2:    # Lines 2 & 3 add number of columns
             addr += self.num_columns
-        self.hal_write_command(self.LCD_DDRAM | addr)
+        return addr
+
+    def move_to(self, cursor_x, cursor_y):
+        """Moves the cursor position to the indicated position. The cursor
+        position is zero based (i.e. cursor_x == 0 indicates first column).
+        """
+        self.cursor_x = cursor_x
+        self.cursor_y = cursor_y
+        if not self.buffered:
+            self.hal_write_command(self.LCD_DDRAM |
+                                   self.ddram_address(cursor_x, cursor_y))
 
     def putchar(self, char):
         """Writes the indicated character to the LCD at the current cursor
@@ -144,12 +222,18 @@ class LcdApi:
             else:
                 self.cursor_x = self.num_columns
         else:
-            self.hal_write_data(ord(char))
+            cell = self.cursor_y * self.num_columns + self.cursor_x
+            self.shadow[cell] = ord(char)
+            if not self.buffered:
+                self.hal_write_data(ord(char))
+                self.screen[cell] = ord(char)
             self.cursor_x += 1
-        if self.cursor_x >= self.num_columns:
-            self.cursor_x = 0
-            self.cursor_y += 1
-            self.implied_newline = (char != '\n')
+        if self.cursor_x < self.num_columns:
+            # The LCD auto-increments its address, so only a wrap needs a move
+            return
+        self.cursor_x = 0
+        self.cursor_y += 1
+        self.implied_newline = (char != '\n')
         if self.cursor_y >= self.num_lines:
             self.cursor_y = 0
         self.move_to(self.cursor_x, self.cursor_y)
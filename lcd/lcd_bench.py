@@ -0,0 +1,76 @@
+"""Reports LCD characters per second for the original and current I2cLcd HAL.
+
+Run on the Pico with the LCD attached:
+
+    import lcd_bench
+    lcd_bench.run()
+"""
+
+import gc
+import utime
+
+from machine import I2C
+from i2c_lcd import (I2cLcd, MASK_RS, MASK_E, SHIFT_BACKLIGHT, SHIFT_DATA,
+                     GC_PER_WRITE, GC_FLUSH, GC_THRESHOLD)
+
+
+class LegacyI2cLcd(I2cLcd):
+    """The HAL as it was before the rewrite: a fresh bytes object for each of
+    four writeto calls, and a gc.collect() after every byte.
+    """
+
+    def hal_write_command(self, cmd):
+        byte = ((self.backlight << SHIFT_BACKLIGHT) |
+                (((cmd >> 4) & 0x0f) << SHIFT_DATA))
+        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        byte = ((self.backlight << SHIFT_BACKLIGHT) |
+                ((cmd & 0x0f) << SHIFT_DATA))
+        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        if cmd <= 3:
+            utime.sleep_ms(5)
+        gc.collect()
+
+    def hal_write_data(self, data):
+        byte = (MASK_RS |
+                (self.backlight << SHIFT_BACKLIGHT) |
+                (((data >> 4) & 0x0f) << SHIFT_DATA))
+        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        byte = (MASK_RS |
+                (self.backlight << SHIFT_BACKLIGHT) |
+                ((data & 0x0f) << SHIFT_DATA))
+        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        gc.collect()
+
+
+def chars_per_second(lcd, text, repeat):
+    """Times repeat full redraws of text starting at the top left corner."""
+    lcd.clear()
+    start = utime.ticks_us()
+    for _ in range(repeat):
+        lcd.move_to(0, 0)
+        lcd.putstr(text)
+    elapsed = utime.ticks_diff(utime.ticks_us(), start)
+    return len(text) * repeat * 1000000 // elapsed
+
+
+def run(i2c=None, i2c_addr=None, num_lines=2, num_columns=16, repeat=20):
+    """Prints characters per second for the legacy HAL and each GC policy."""
+    if i2c is None:
+        i2c = I2C(0, freq=400000)
+    if i2c_addr is None:
+        i2c_addr = i2c.scan()[0]
+    text = ''.join(chr(0x41 + i % 26) for i in range(num_lines * num_columns))
+    lcd = LegacyI2cLcd(i2c, i2c_addr, num_lines, num_columns, gc_policy=GC_PER_WRITE)
+    print('legacy HAL:', chars_per_second(lcd, text, repeat), 'chars/s')
+    for name, policy in (('per write', GC_PER_WRITE), ('per flush', GC_FLUSH),
+                         ('threshold', GC_THRESHOLD)):
+        lcd = I2cLcd(i2c, i2c_addr, num_lines, num_columns, gc_policy=policy)
+        print('new HAL, gc', name + ':', chars_per_second(lcd, text, repeat), 'chars/s')
+
+
+if __name__ == '__main__':
+    run()
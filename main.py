@@ -25,449 +25,28 @@ Physical loader is a 4 spoke paddle wheel design, with holes for ir
 break-beam sensors to detect both positioning and payload.
 
 """
-import sys, drivers, threading, configparser
-from time import sleep
-from time import time as ti
-from gpiozero import Button, LED, Motor, DigitalOutputDevice
-import os.path
-import os
-
-sleep(1.5)
-home_pin = 25
-start_pin = 20
-reset_pin = 16
-load_pin = 8
-retract_pin = 7
-l1 = 17
-l2 = 21
-disp_sda = 2
-disp_scl = 3
-crushPin = 19
-compPin = 13
-case_safety = 24
-ts = ti()
-nts = ''
-lcd_timeout = True
-lcd_status = 'Green'
-
-# Non-Class devices
-led1 = LED(l1)
-led2 = LED(l2)
-home_switch = Button(home_pin, pull_up=True)
-safe_switch = Button(case_safety, pull_up=True)
-start_button = Button(start_pin, pull_up=True)
-reset_button = Button(reset_pin, pull_up=True)
-loader = Motor(load_pin, retract_pin)
-crusher = DigitalOutputDevice(crushPin, active_high=False, initial_value=False)
-crusher.off()
-compressor = DigitalOutputDevice(compPin, active_high=False, initial_value=False)
-compressor.off()
-
-### Instantiate classes
-# Create display instance
-# lcd = drivers.Lcd()
-
-def switch_test():
+import argparse
+from aircrusher import CrusherController
+from aircrusher.stations import StationGroup, STATION_PINS
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Automated can crusher')
+	parser.add_argument('boot_time', type=int, nargs='?',
+		help='boot pressurize time in seconds (default: from the time since last run)')
+	parser.add_argument('--stations', type=int, default=1, choices=range(1, len(STATION_PINS) + 1),
+		help='stations sharing the compressor, wired as in aircrusher.stations (default 1)')
+	args = parser.parse_args(argv)
+	if args.stations > 1:
+		controller = StationGroup(STATION_PINS[:args.stations])
+	else:
+		controller = CrusherController()
 	try:
-		while True:
-			if start_button.is_pressed:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Start Pressed', 1)
-				print("Start Pressed")
-			else:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Start released', 1)
-				print("Start released")
-			sleep(1)
-			if reset_button.is_pressed:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Reset Pressed', 1)
-				print("Reset Pressed")
-			else:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Reset released', 1)
-				print("Reset released")
-			sleep(1)
-			if safe_switch.is_pressed:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Safe Pressed', 1)
-				print("Safe Pressed")
-			else:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Safe released', 1)
-				print("Safe released")
-			sleep(1)
-			if home_switch.is_pressed:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Home Pressed', 1)
-				print("Home Pressed")
-			else:
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Home released', 1)
-				print("Home released")
-			sleep(1)
+		controller.start(args.boot_time)
+		controller.run()
 	except KeyboardInterrupt:
-		# If there is a KeyboardInterrupt (when you press ctrl+c), exit the program and cleanup
-		print("Cleaning up!")
-		# display.lcd_clear()
-		# lcd.lcd_display_string('Exiting debug', 1)
-		sleep(3)
-		# display.lcd_clear()
-
-def is_safe():
-	if safe_switch.is_pressed:
-		# lcd.lcd_clear()
-		# lcd.lcd_display_string('Rotator Jammed', 1)
-		print("Rotator is Jammed!")
-		sys.exit()
-	else:
-		# lcd.lcd_clear()
-		# lcd.lcd_display_string('Safe to Run', 1)
-		print("Safe to run")
-		return True
-
-def lcd_timer():
-	nts = ti()
-	time_diff = nts - ts
-	if time_diff >= 900:
-		return True
-	else:
-		return False
-
-def lcd_change_color(need):
-	global lcd_status
-	if lcd_status == need:
-		pass
-	else:
-		# lcd.lcd_clear()
-		# lcd.lcd_display_string('Loader ready', 1)
-		# lcd.lcd_display_string(need + ' to start', 2)
-		lcd_status = need
-		print('lcd_status set to ' + need)
-
-def lcd_timeout_test():
-	global lcd_timeout
-	lcd_timeout = lcd_timer()
-	if lcd_timeout:
-		lcd_change_color('Green')
-	else:
-		lcd_change_color('Red')
-
-def home():
-	is_safe()
-	global ts
-	# looptime = ti()
-	try:
-		led1.on()
-		if load_can():
-			# Add pressure check function here later
-			compressor.on()
-			countdown(need_pressure())
-			crush_it()
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Can Found', 1)
-			# lcd.lcd_display_string('and Crushed!', 2)
-			sleep(3)
-			compressor.off()
-			lcd_timeout_test()
-			blink()
-		else:
-			if not safe_switch.is_pressed:
-				print('Safe Passed')
-				lcd_timeout_test()
-				compressor.off()
-				blink()
-				return True
-			else:
-				print('Home function timed out')
-				# lcd.lcd_clear()
-				# lcd.lcd_display_string('Timeout...', 1)
-				blink_error()
-				return False
-	except KeyboardInterrupt:
-		print('Program terminated by KBI')
-		led1.off()
-		return False
-
-def load_can():
-	if is_safe():
-		sleep(1)
-		# lcd.lcd_clear()
-		# lcd.lcd_display_string('Safe passed', 1)
-	can_there = False
-	can_loaded = False
-	# lcd.lcd_clear()
-	delay = ti() + 3
-	while not home_switch.is_pressed:
-		loader.forward()
-		sleep(0.25)
-		if ti() > delay:
-			print('Loader Jammed!')
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Timeout reached!', 1)
-			# lcd.lcd_display_string('Loader Jammed!', 2)
-			back_off()
-			return False
-		if can_there and not safe_switch.is_pressed:
-			can_loaded = True
-			print('Can Loaded')
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Can Loaded', 1)
-		elif safe_switch.is_pressed:
-			can_there = True
-			print('Can Found')
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Can Found', 1)
-		else:
-			print('Keep Moving')
-	unhome()
-	sleep(0.25)
-	if can_there and not safe_switch.is_pressed:
-		can_loaded = True
-		print('Can Loaded')
-		# lcd.lcd_clear()
-		# lcd.lcd_display_string('Can Loaded', 1)
-	if can_there and can_loaded:
-		return True
-	else:
-		return False
-
-def back_off():
-	loader.backward()
-	sleep(0.5)
-	loader.stop()
-
-def unhome():
-	print("unhoming")
-	loader.forward()
-	home_switch.wait_for_release()
-	loader.stop()
-
-def f_inch(val=0.25):
-	loader.forward()
-	sleep(val)
-	loader.stop()
-
-def b_inch(val=0.25):
-	loader.reverse()
-	sleep(val)
-	loader.stop()
-
-def crush_it():
-	print("Crushing")
-	# lcd.lcd_clear()
-	# lcd.lcd_display_string("Crushing!!", 1)
-	compressor.off()
-	sleep(0.5)
-	crusher.on()
-	sleep(1)
-	# lcd.lcd_clear()
-	print("Retracting")
-	# lcd.lcd_display_string("Retracting!!", 2)
-	crusher.off()
-	sleep(0.5)
-	# lcd.lcd_clear()
-	# lcd.lcd_display_string("Crush Complete", 1)
-	compressor.on()
-	sleep(2)
-
-def blink():
-	print("blink")
-	led1.blink(on_time=0.07, off_time=0.07, n=10, background=False)
-	led2.blink(on_time=0.07, off_time=0.07, n=10, background=False)
-
-def blink_error():
-	print("blink_error")
-	led1.blink(on_time=0.5, off_time=0.5, n=3, background=False)
-	led2.blink(on_time=0.5, off_time=0.5, n=3, background=False)
-
-def countdown(n):
-	while n>0:
-		print(str(n), 'seconds left')
-		# lcd.lcd_clear()
-		thisSecond = str(n)
-		# lcd.lcd_display_string( 'Pressurizing....', 1)
-		thisMessage = ''
-		thisMessage = str('Countdown = ' + str(n))
-		# lcd.lcd_display_string(thisMessage, 2)
-		n = n -1
-		sleep(0.8)
-
-def need_pressure():
-	nts = ti()
-	time_diff = nts - ts
-	if time_diff >= 2400:
-		print("Time greater than 40 min")
-		return 17
-	elif time_diff <= 420:
-		print("Time less than 7 min")
-		return 5
-	else:
-		print("time_diff = ", str(time_diff))
-		print("Calculating required time...")
-		pressure_time_ratio = round(time_diff / 140)
-		return pressure_time_ratio
-
-
-def set_time_stamp():
-	global ts
-	ts = ti()
-	new_ts = str(ts)
-	file_name = "./time.ini" #file to be searched
-	check_file = os.path.isfile(file_name)
-	if check_file:
-		config_obj = configparser.ConfigParser()
-		config_obj.read(file_name)
-		time_group = config_obj["time_stamp"]
-		last_time = time_group["last_time"]
-		print('Previous time stamp: ' + str(last_time))
-		config_obj.set('time_stamp', 'last_time', new_ts)
-		configFile = open(file_name, 'w')
-		config_obj.write(configFile)
-		configFile.close()
-		print('New timestamp set: ' + new_ts)
-	else:
-		config_obj = configparser.ConfigParser()
-		config_obj.add_section("time_stamp")
-		config_obj.set("time_stamp", "last_time", new_ts)
-		configFile = open(file_name, 'w')
-		config_obj.write(configFile)
-		configFile.close()
-		print("New time.ini file created.")
-		print('New timestamp set: ' + new_ts)
-
-def read_time_stamp():
-	file_name = "./time.ini" #file to be searched
-	check_file = os.path.isfile(file_name)
-	time_now = ti()
-	if check_file:
-		config_obj = configparser.ConfigParser()
-		config_obj.read(file_name)
-		time_group = config_obj["time_stamp"]
-		last_time = float(time_group["last_time"])
-		time_diff = time_now - last_time
-		print('Recorded Time Stamp from file: ' + str(last_time))
-		print('Diff = ' + str(time_diff))
-		if time_diff >= 2400:
-			print("Time greater than 40 min")
-			return 20
-		elif time_diff <= 420:
-			print("Time less than 7 min")
-			return 5
-		else:
-			print("time_diff = ", str(time_diff))
-			print("Calculating required time...")
-			pressure_time_ratio = round(time_diff / 80)
-			return pressure_time_ratio
-	else:
-		time_diff = 20
-		print("No time.ini file found. Sending default.")
-		print("time_diff default= ", str(time_diff))
-		return time_diff
-
-def runCycler():
-	global ts
-	# Add pressure check function here later
-	compressor.on()
-	countdown(need_pressure())
-	crush_it()
-	led1.on()
-	led2.on()
-	while load_can():
-		crush_it()
-		sleep(5)
-	else:
-		# lcd.lcd_clear()
-		# lcd.lcd_display_string("No more cans!!", 1 )
-		# lcd.lcd_display_string("Reset in 10 sec", 2)
-		sleep(5)
-		compressor.off()
-	set_time_stamp()
-	lcd_timeout_test()
-	led1.off()
-	led2.off()
-
-## Beginning of commands ##
-# Safety check
-is_safe()
-print("Safety Check Done")
-# Acknowledge power on
-# lcd.lcd_clear()
-# lcd.lcd_display_string("Power-On-", 1)
-# lcd.lcd_display_string("Self-Test", 2)
-sleep(1)
-
-
-
-
-if len(sys.argv) >= 2:
-	n = int(sys.argv[1])
-else:
-	n = read_time_stamp()
-
-compressor.on()
-countdown(n)
-compressor.off()
-set_time_stamp()
-
-# Ensure crusher is retracted at start
-crusher.off()
-
-# Home the rotor
-# lcd.lcd_clear()
-# lcd.lcd_display_string("Homing loader", 1)
-# lcd.lcd_display_string("for first time", 2)
-sleep(2)
-# lcd.lcd_clear()
-home()
-# Wait for Start Button
-try:
-	while True:
-		first = start_button.value
-		r_first = reset_button.value
-		sleep(0.01)
-		second = start_button.value
-		r_second = reset_button.value
-		lcd_timeout_test()
-		if first and not second:
-			sleep(0.01)
-			print("Green pressed")
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Start pressed!', 1)
-		elif not first and second:
-			sleep(0.01)
-			print("Green released")
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Start released!', 1)
-			runCycler()
-		elif r_first and not r_second:
-			sleep(0.01)
-			print("Red pressed")
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Reset Pressed', 1)
-		elif not r_first and r_second:
-			sleep(0.01)
-			print("Red released")
-			# lcd.lcd_clear()
-			# lcd.lcd_display_string('Reset released', 1)
-			compressor.on()
-			want_pressure = need_pressure()
-			if want_pressure < 15:
-				want_pressure = 15
-			countdown(want_pressure)
-			runCycler()
-			compressor.off()
-			set_time_stamp()
-			lcd_timeout_test()
+		controller.stop('Program Stop', 'by KBI')
 
 
-except KeyboardInterrupt:
-	# lcd.lcd_clear()
-	# lcd.lcd_display_string('Program Stop', 1)
-	# lcd.lcd_display_string('by KBI',2)
-	loader.stop()
-	crusher.off()
-	compressor.off()
-	blink_error()
-	led1.off()
-	led2.off()
+if __name__ == '__main__':
+	main()
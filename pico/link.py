@@ -0,0 +1,118 @@
+"""Framing and command set for the serial link between the Pi and the Pico.
+
+Every message, either way, is one frame:
+
+    SYNC  length  seq  command  payload...  crc_lo  crc_hi
+
+length counts the seq, command and payload bytes. The CRC is CRC-16/CCITT
+(polynomial 0x1021, initial value 0xFFFF) over everything from the length
+byte to the end of the payload. A reply carries the command of its request
+with the REPLY bit set, the same seq, and a status byte as the first byte of
+its payload.
+
+This file runs unchanged under MicroPython on the Pico and CPython on the Pi.
+"""
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+SYNC = 0xA5
+REPLY = 0x80
+MAX_PAYLOAD = 128           # a screen of 4 lines of 20 characters fits
+
+# commands
+PING = 0x01
+INDEX = 0x10                # int8 spokes; replies once the wheel is there
+STEP = 0x11                 # int16 steps, negative turns backwards
+HOME = 0x12                 # uint8 timeout in seconds
+STOP = 0x13                 # ends the move in progress after one half-step
+SHOW = 0x20                 # uint8 line, then the text
+DEFINE_SCREEN = 0x21        # uint8 screen, then its lines joined by '\n'
+SCREEN = 0x22               # uint8 screen
+SENSORS = 0x30              # reply: uint8 beam, uint8 moving, uint16 pressure
+
+# reply status
+OK = 0
+FAILED = 1                  # a move timed out or was stopped
+BUSY = 2                    # a move is already in progress
+BAD_COMMAND = 3
+BAD_PAYLOAD = 4
+
+
+def crc16(data, crc=0xFFFF):
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def encode(seq, command, payload=b''):
+    """Returns the frame for one message."""
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError('payload too long')
+    body = bytes((len(payload) + 2, seq & 0xFF, command)) + bytes(payload)
+    return bytes((SYNC,)) + body + struct.pack('<H', crc16(body))
+
+
+class FrameReader:
+    """Reassembles frames from a byte stream that may arrive in any size of
+    piece. Noise before a frame, and any frame whose length or CRC is wrong,
+    is dropped and the reader resynchronises on the next SYNC byte.
+    """
+
+    def __init__(self):
+        self.buf = b''
+        self.errors = 0
+
+    def feed(self, data):
+        """Adds received bytes and returns the complete frames in them as
+        (seq, command, payload) tuples."""
+        # bytes rather than bytearray: MicroPython's bytearray has no find()
+        buf = self.buf + bytes(data)
+        frames = []
+        while True:
+            start = buf.find(bytes((SYNC,)))
+            if start < 0:
+                buf = b''
+                break
+            buf = buf[start:]
+            if len(buf) < 2:
+                break
+            length = buf[1]
+            if length < 2 or length > MAX_PAYLOAD + 2:
+                self.errors += 1
+                buf = buf[1:]
+                continue
+            end = 2 + length + 2
+            if len(buf) < end:
+                break
+            body = buf[1:2 + length]
+            if struct.unpack('<H', buf[2 + length:end])[0] != crc16(body):
+                # the SYNC may have been a data byte; look for the next one
+                self.errors += 1
+                buf = buf[1:]
+                continue
+            frames.append((body[1], body[2], body[3:]))
+            buf = buf[end:]
+        self.buf = buf
+        return frames
+
+
+def reply(seq, command, status, payload=b''):
+    """Returns the frame answering a request."""
+    return encode(seq, command | REPLY, bytes((status,)) + bytes(payload))
+
+
+def pack_sensors(beam, moving, pressure):
+    return struct.pack('<BBH', beam, moving, pressure)
+
+
+def unpack_sensors(payload):
+    beam, moving, pressure = struct.unpack('<BBH', bytes(payload[:4]))
+    return {'beam': bool(beam), 'moving': bool(moving), 'pressure': pressure}
@@ -0,0 +1,188 @@
+"""Firmware for the Pico that runs the loader stepper and the LCD for the Pi.
+
+Copy this file and link.py, with crusher/Stepper.py, lcd/lcd_api.py and
+lcd/i2c_lcd.py, to the root of the Pico's filesystem. It boots into serve().
+Firmware only touches the hardware it is handed, so sim/pico.py runs it
+under CPython against a fake wheel and LCD.
+
+The Pi sends commands over the USB serial port in the frames described in
+link.py; drivers/pico.py is the Pi side. The Pi's GPIO UART is taken by
+station pins, so the link uses USB, which also powers the Pico. Step
+timing, the home beam interrupt and the LCD's command delays all run here,
+where Linux scheduling cannot stretch them.
+
+Moves are stepped on core 1, which does nothing else and does not allocate
+while stepping, so neither I2C writes to the LCD nor a garbage collection
+on core 0 can hold a coil phase. Core 0 runs the uasyncio loop that serves
+the link, so STOP, SENSORS and display commands are answered while the
+wheel turns, and a move is answered when core 1 reports it finished.
+"""
+
+import _thread
+import sys
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+import link
+import Stepper
+
+LCD_ADDR = 0x27
+LCD_LINES = 2
+LCD_COLUMNS = 16
+POCKETS = 4                 # pockets in the loader's paddle wheel
+INDEX_TIMEOUT = 10          # seconds allowed for each spoke
+MOVE_POLL = 0.005           # seconds between checks for the end of a move
+
+
+class Firmware:
+    """Serves the link on rx, a stream with an async read(n), and tx, a
+    stream with write(data). beam is the home beam's Pin and pressure an ADC.
+    """
+
+    def __init__(self, rx, tx, stepper, lcd, beam, pressure):
+        self.rx = rx
+        self.tx = tx
+        self.stepper = stepper
+        # stdout is the link; a message from core 1 could land inside a reply
+        self.stepper.log = None
+        self.lcd = lcd
+        self.beam = beam
+        self.pressure = pressure
+        self.reader = link.FrameReader()
+        self.screens = {}
+        self.move = None
+        self.job = None
+        self.result = None
+        self.cancelled = False
+        self.jobs = _thread.allocate_lock()
+        self.jobs.acquire()
+        self.stepping = False
+        # Only the cells that differ from the screen are sent on flush()
+        self.lcd.set_buffered(True)
+
+    async def serve(self):
+        """Reads frames from the Pi for ever, answering each one."""
+        if not self.stepping:
+            self.stepping = True
+            _thread.start_new_thread(self.step_loop, ())
+        while True:
+            data = await self.rx.read(64)
+            for seq, command, payload in self.reader.feed(data):
+                self.dispatch(seq, command, payload)
+
+    def send(self, seq, command, status, payload=b''):
+        self.tx.write(link.reply(seq, command, status, payload))
+
+    def dispatch(self, seq, command, payload):
+        try:
+            if command == link.PING:
+                self.send(seq, command, link.OK)
+            elif command in (link.INDEX, link.STEP, link.HOME):
+                self.start_move(seq, command, payload)
+            elif command == link.STOP:
+                # A move not yet started on core 1 would clear the stepper's flag
+                if self.move is not None:
+                    self.cancelled = True
+                self.stepper.stop()
+                self.send(seq, command, link.OK)
+            elif command == link.SHOW:
+                self.show_lines({payload[0]: payload[1:].decode()})
+                self.send(seq, command, link.OK)
+            elif command == link.DEFINE_SCREEN:
+                self.screens[payload[0]] = payload[1:].decode().split('\n')
+                self.send(seq, command, link.OK)
+            elif command == link.SCREEN:
+                lines = self.screens.get(payload[0])
+                if lines is None:
+                    self.send(seq, command, link.BAD_PAYLOAD)
+                    return
+                self.show_lines(dict(enumerate(lines)))
+                self.send(seq, command, link.OK)
+            elif command == link.SENSORS:
+                moving = self.move is not None
+                self.send(seq, command, link.OK,
+                          link.pack_sensors(self.beam.value(), moving, self.pressure.read_u16()))
+            else:
+                self.send(seq, command, link.BAD_COMMAND)
+        except (IndexError, ValueError, UnicodeError):
+            self.send(seq, command, link.BAD_PAYLOAD)
+
+    def show_lines(self, lines):
+        for line, text in lines.items():
+            if line < LCD_LINES:
+                self.lcd.move_to(0, line)
+                self.lcd.putstr(text[:LCD_COLUMNS] + ' ' * (LCD_COLUMNS - len(text)))
+        self.lcd.flush()
+
+    def start_move(self, seq, command, payload):
+        if self.move is not None:
+            self.send(seq, command, link.BUSY)
+            return
+        if command == link.INDEX:
+            spokes = link.struct.unpack('<b', payload)[0]
+            job = (self.stepper.index, (spokes, POCKETS, INDEX_TIMEOUT))
+        elif command == link.STEP:
+            job = (self.count_steps, (link.struct.unpack('<h', payload)[0],))
+        else:
+            job = (self.stepper.home, (payload[0] if payload else 30,))
+        self.cancelled = False
+        self.move = asyncio.create_task(self.run_move(seq, command, job))
+
+    def count_steps(self, count):
+        self.stepper.step(count)
+        return not self.stepper.stopped
+
+    async def run_move(self, seq, command, job):
+        # Hands the move to core 1 and waits for its result
+        try:
+            self.result = None
+            self.job = job
+            self.jobs.release()
+            while self.result is None:
+                await asyncio.sleep(MOVE_POLL)
+            done = self.result
+        finally:
+            self.move = None
+        self.send(seq, command, link.OK if done else link.FAILED)
+
+    def step_loop(self):
+        """Runs on core 1 for good, making each move it is handed."""
+        while True:
+            self.jobs.acquire()
+            move, args = self.job
+            done = False
+            try:
+                if not self.cancelled:
+                    done = bool(move(*args))
+            except Exception:
+                # Nothing is printed, as stdout is the link; the Pi sees FAILED
+                pass
+            self.result = done
+
+
+def create():
+    import micropython
+    from machine import ADC, I2C, Pin
+    from i2c_lcd import I2cLcd, GC_THRESHOLD
+    # The USB port is also the REPL's; without this a 0x03 byte in a frame
+    # would raise KeyboardInterrupt
+    micropython.kbd_intr(-1)
+    coils = [Pin(n, Pin.OUT) for n in (2, 3, 4, 5)]
+    stepper = Stepper.create(coils[0], coils[1], coils[2], coils[3],
+                             Pin(25, Pin.OUT), Pin(6, Pin.IN, Pin.PULL_UP))
+    # No gc.collect() after each flush; the allocator collects when it must
+    lcd = I2cLcd(I2C(0, sda=Pin(8), scl=Pin(9), freq=400000), LCD_ADDR, LCD_LINES, LCD_COLUMNS,
+                 gc_policy=GC_THRESHOLD)
+    return Firmware(asyncio.StreamReader(sys.stdin.buffer), sys.stdout.buffer,
+                    stepper, lcd, stepper.ir1, ADC(26))
+
+
+def serve():
+    asyncio.run(create().serve())
+
+
+if __name__ == '__main__':
+    serve()
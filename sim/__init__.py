@@ -0,0 +1,8 @@
+"""
+Hardware-in-the-loop simulator for aircrusher.CrusherController.
+
+The controller's real gpiozero devices are bound to a MockFactory, and a
+plant model drives the mock pins the way the paddle wheel, break beams and
+ram would. See sim/bench.py for the throughput benchmarks built on it.
+
+"""
@@ -0,0 +1,174 @@
+"""
+Throughput benchmarks for the crusher cycle, run against the plant model.
+
+	python -m sim.bench --scale 20
+
+Each scenario runs the controller's real runCycler() on mock pins and
+reports cans per minute, time to first crush, jams and jam recovery time,
+all in simulated seconds, strokes made below full crushing pressure, and for
+a safety trip the real time from the beam edge to every output being safe.
+The station scenarios run a StationGroup sharing one compressor and tank,
+with a plant per station, and report the combined rate.
+
+"""
+import argparse, contextlib, io, os, sys, tempfile
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+from aircrusher import CrusherController
+from aircrusher.journal import StateJournal
+from aircrusher.stations import StationGroup, STATION_PINS
+from sim.plant import Plant, ScaledClock, Tank
+
+SCENARIOS = [
+	# name, plant settings, controller settings
+	('serial', dict(cans=8), dict(pipeline_mode=False)),
+	('pipelined', dict(cans=8), dict(pipeline_mode=True)),
+	('pipelined, 6 cans/min supply', dict(cans=1, arrival_rate=6), dict(pipeline_mode=True)),
+	('pipelined, 15% jams', dict(cans=8, jam_rate=0.15, seed=1), dict(pipeline_mode=True)),
+	('serial, reed switches', dict(cans=8, reeds=True), dict(pipeline_mode=False)),
+	('pipelined, reed switches', dict(cans=8, reeds=True), dict(pipeline_mode=True)),
+	('pipelined, hand in throat', dict(cans=8, intrusion=(30, 2)), dict(pipeline_mode=True)),
+]
+# name, number of stations, plant settings for each station
+STATION_SCENARIOS = [
+	('1 station, shared air', 1, dict(cans=8)),
+	('2 stations', 2, dict(cans=8)),
+	('3 stations', 3, dict(cans=8)),
+	('4 stations', 4, dict(cans=8)),
+]
+# Spare BCM pins for the reed switches, only driven in the reeds=True scenarios
+REED_PINS = {'extended': 5, 'retracted': 6}
+
+
+def load_controller():
+	# The mock factory has to be in place before the controller builds its devices
+	Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+	controller = CrusherController(pins=REED_PINS, prom_path=None)
+	controller.init_hardware()
+	return controller
+
+
+def run_scenario(controller, clock, plant_settings, settings, state_dir):
+	for name, value in settings.items():
+		setattr(controller, name, value)
+	controller.journal = StateJournal(os.path.join(state_dir, 'state.journal'))
+	reeds = plant_settings.get('reeds', False)
+	controller.extend_stroke.attach(controller.inputs if reeds else None, 'extended')
+	controller.retract_stroke.attach(controller.inputs if reeds else None, 'retracted')
+	# Pressurized five minutes ago, so the countdown is the short one
+	controller.ts = clock.time() - 300
+	plant = Plant(controller, clock, **plant_settings)
+	plant.start()
+	# Each scenario starts with the throat clear and the supervisor unlatched
+	controller.safety.reset()
+	controller.safety.last_reaction = None
+	start = clock.monotonic()
+	try:
+		controller.runCycler()
+	finally:
+		plant.stop()
+		controller.journal.close()
+	end = clock.monotonic()
+	crushes = plant.crushes
+	result = {
+		'cans': len(crushes),
+		'elapsed': end - start,
+		'first_crush': crushes[0] - start if crushes else None,
+		'cans_per_minute': None,
+		'jams': len(plant.jams),
+		'recovery': max(plant.recoveries) if plant.recoveries else None,
+		'violations': plant.interlock_violations,
+		'reaction': controller.safety.last_reaction,
+		'low_pressure': plant.tank.low_strokes,
+	}
+	if len(crushes) > 1:
+		result['cans_per_minute'] = (len(crushes) - 1) * 60 / (crushes[-1] - crushes[0])
+	return result
+
+
+def run_stations(count, clock, plant_settings, state_dir):
+	# Each group gets a fresh mock factory, as its stations reuse the single
+	# controller's pins
+	Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+	group = StationGroup(STATION_PINS[:count], state_dir=state_dir)
+	group.init_hardware()
+	group.inputs.clock = clock.monotonic
+	group.air.clock = clock.monotonic
+	# One compressor, one tank
+	tank = Tank(group.compressor)
+	plants = []
+	for n, station in enumerate(group.stations, 1):
+		clock.install(station)
+		station.pipeline_mode = True
+		station.journal = StateJournal(os.path.join(state_dir, 'station-%d.journal' % n))
+		station.telemetry.prom_path = None
+		station.ts = clock.time() - 300
+		plants.append(Plant(station, clock, tank=tank, **plant_settings))
+	for plant in plants:
+		plant.start()
+	start = clock.monotonic()
+	try:
+		group.run_batch()
+	finally:
+		for plant in plants:
+			plant.stop()
+		for station in group.stations:
+			station.journal.close()
+	crushes = sorted(now for plant in plants for now in plant.crushes)
+	result = {
+		'cans': len(crushes),
+		'elapsed': clock.monotonic() - start,
+		'first_crush': crushes[0] - start if crushes else None,
+		'cans_per_minute': None,
+		'jams': sum(len(plant.jams) for plant in plants),
+		'recovery': None,
+		'violations': sum(plant.interlock_violations for plant in plants),
+		'low_pressure': tank.low_strokes,
+	}
+	if len(crushes) > 1:
+		result['cans_per_minute'] = (len(crushes) - 1) * 60 / (crushes[-1] - crushes[0])
+	return result
+
+
+def fmt(value, unit=''):
+	if value is None:
+		return '-'
+	if isinstance(value, float):
+		return '%.1f%s' % (value, unit)
+	return '%d%s' % (value, unit)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--scale', type=float, default=20,
+		help='how many times faster than real time to run (default 20)')
+	parser.add_argument('--verbose', action='store_true', help="show the controller's output")
+	args = parser.parse_args(argv)
+	controller = load_controller()
+	clock = ScaledClock(args.scale)
+	clock.install(controller)
+	print('%-30s %6s %8s %9s %5s %9s %10s %7s %9s' % ('scenario', 'cans', 'cans/min',
+		'1st crush', 'jams', 'recovery', 'violations', 'low psi', 'trip'))
+	with tempfile.TemporaryDirectory() as state_dir:
+		for name, plant_settings, settings in SCENARIOS:
+			out = sys.stdout if args.verbose else io.StringIO()
+			with contextlib.redirect_stdout(out):
+				result = run_scenario(controller, clock, plant_settings, settings, state_dir)
+			report(name, result)
+		for name, count, plant_settings in STATION_SCENARIOS:
+			out = sys.stdout if args.verbose else io.StringIO()
+			with contextlib.redirect_stdout(out):
+				result = run_stations(count, clock, plant_settings, state_dir)
+			report(name, result)
+
+
+def report(name, result):
+	reaction = result.get('reaction')
+	print('%-30s %6s %8s %9s %5s %9s %10s %7s %9s' % (name, fmt(result['cans']),
+		fmt(result['cans_per_minute']), fmt(result['first_crush'], 's'),
+		fmt(result['jams']), fmt(result['recovery'], 's'), fmt(result['violations']),
+		fmt(result['low_pressure']), '-' if reaction is None else '%.2fms' % (reaction * 1000)))
+
+
+if __name__ == '__main__':
+	main()
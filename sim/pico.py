@@ -0,0 +1,244 @@
+"""
+The Pico firmware on a pty pair, and a benchmark of the link.
+
+	python -m sim.pico
+
+Board runs the real Firmware from pico/main.py under CPython, on its own
+thread and event loop, against a fake paddle wheel, LCD and pressure
+sensor, on the master end of a pty. The stepper is the real crusher/Stepper.py
+turning the wheel half-step by half-step on the host clock, on the second
+thread the firmware starts for core 1. The benchmark
+drives it through the real drivers.pico.PicoLink opened on the slave end, and
+reports round trip times, whether status requests are still answered while
+the wheel is turning, and recovery from line noise.
+
+"""
+import argparse, asyncio, os, pty, random, statistics, sys, threading, time
+
+# The firmware imports its neighbours by bare name, as they sit together in
+# the root of the Pico's filesystem
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('pico', 'crusher', 'lcd'):
+	if os.path.join(ROOT, folder) not in sys.path:
+		sys.path.append(os.path.join(ROOT, folder))
+
+import Stepper
+from lcd_api import LcdApi
+from drivers.pico import PicoLink
+from pico import main as firmware
+
+
+class Pin:
+	# machine.Pin for an output nobody reads back
+	def __init__(self, level=0):
+		self.level = level
+
+	def value(self, level=None):
+		if level is None:
+			return self.level
+		self.level = level
+
+
+class Adc:
+	def __init__(self, reading=32768):
+		self.reading = reading
+
+	def read_u16(self):
+		return self.reading
+
+
+class Wheel:
+	# The loader's paddle wheel as the firmware sees it: four coil pins that turn
+	# it a half-step per phase change, and the home beam, broken while a spoke is
+	# within width half-steps past it. Passed to the stepper as its ir1 Pin.
+	IRQ_RISING = 1
+
+	def __init__(self, pockets=firmware.POCKETS, width=16):
+		self.pocket = Stepper.Stepper.FULL_ROTATION * len(Stepper.Stepper.ROTATE) // pockets
+		self.width = width
+		self.position = 0		# half-steps from a spoke in the beam
+		self.levels = [0, 0, 0, 0]
+		self.phase = 0
+		self.handler = None
+		self.coils = [self.coil(n) for n in range(4)]
+
+	def coil(self, n):
+		def write(level):
+			self.levels[n] = level
+			if n == 3:
+				self.energised()
+		return write
+
+	def energised(self):
+		# Released coils leave the wheel where it is
+		if self.levels not in Stepper.Stepper.ROTATE:
+			return
+		phase = Stepper.Stepper.ROTATE.index(self.levels)
+		turn = (phase - self.phase) % len(Stepper.Stepper.ROTATE)
+		self.phase = phase
+		before = self.value()
+		if turn == 1:
+			self.position += 1
+		elif turn == len(Stepper.Stepper.ROTATE) - 1:
+			self.position -= 1
+		if self.handler is not None and self.value() and not before:
+			self.handler(self)
+
+	def value(self):
+		return int(self.position % self.pocket < self.width)
+
+	def irq(self, handler=None, trigger=None, hard=False):
+		self.handler = handler
+
+
+class Lcd(LcdApi):
+	# An HD44780 that only keeps the cells it was sent
+	def __init__(self, lines=firmware.LCD_LINES, columns=firmware.LCD_COLUMNS):
+		self.writes = 0
+		LcdApi.__init__(self, lines, columns)
+
+	def hal_write_command(self, cmd):
+		self.writes += 1
+
+	def hal_write_data(self, data):
+		self.writes += 1
+
+	def hal_sleep_us(self, usecs):
+		pass
+
+	@property
+	def display(self):
+		cols = self.num_columns
+		return [self.screen[y * cols:(y + 1) * cols].decode() for y in range(self.num_lines)]
+
+
+class Serial:
+	# The firmware's end of the pty, as both its rx and tx stream. A byte is
+	# corrupted with chance noise in either direction.
+	def __init__(self, fd, noise=0.0, seed=None):
+		self.fd = fd
+		self.noise = noise
+		self.random = random.Random(seed)
+
+	async def read(self, n):
+		loop = asyncio.get_running_loop()
+		ready = loop.create_future()
+		loop.add_reader(self.fd, ready.set_result, None)
+		try:
+			await ready
+		finally:
+			loop.remove_reader(self.fd)
+		return self.garble(os.read(self.fd, n))
+
+	def write(self, data):
+		os.write(self.fd, self.garble(data))
+
+	def garble(self, data):
+		if not self.noise:
+			return data
+		return bytes(b ^ 0x10 if self.random.random() < self.noise else b for b in data)
+
+
+class Board:
+	def __init__(self, fd, noise=0.0, seed=None, pressure=32768):
+		self.wheel = Wheel()
+		self.lcd = Lcd()
+		self.serial = Serial(fd, noise, seed)
+		self.stepper = Stepper.create(*self.wheel.coils, Pin(), self.wheel)
+		self.firmware = firmware.Firmware(self.serial, self.serial, self.stepper, self.lcd,
+			self.wheel, Adc(pressure))
+		self.loop = asyncio.new_event_loop()
+		self.task = None
+		self.thread = None
+
+	def start(self):
+		self.task = self.loop.create_task(self.firmware.serve())
+		self.thread = threading.Thread(target=self.run, name='fake-pico', daemon=True)
+		self.thread.start()
+
+	def run(self):
+		try:
+			self.loop.run_until_complete(self.task)
+		except (asyncio.CancelledError, OSError):
+			# stopped, or the PicoLink end of the pty was closed
+			pass
+
+	def stop(self):
+		self.stepper.stop()
+		self.loop.call_soon_threadsafe(self.task.cancel)
+		self.thread.join(5)
+
+
+def open_pair(**settings):
+	# A Board on the master end and a PicoLink on the slave end of a new pty
+	master, slave = pty.openpty()
+	board = Board(master, **settings)
+	board.start()
+	client = PicoLink(os.ttyname(slave))
+	os.close(slave)
+	return board, client
+
+
+def percentile(samples, p):
+	samples = sorted(samples)
+	return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--count', type=int, default=500, help='round trips to time (default 500)')
+	parser.add_argument('--noise', type=float, default=0.002,
+		help='chance of a corrupted byte in the noisy run (default 0.002)')
+	args = parser.parse_args(argv)
+
+	board, client = open_pair()
+	rtts = [client.ping() * 1000 for _ in range(args.count)]
+	print('ping round trip        p50 %.2fms  p99 %.2fms' % (statistics.median(rtts), percentile(rtts, 0.99)))
+
+	# Sensor reads and screen changes while the wheel turns
+	client.define_screen(3, 'Loading', 'Cans: 12')
+	done = []
+	mover = threading.Thread(target=lambda: done.append(client.index(2)))
+	start = time.monotonic()
+	mover.start()
+	time.sleep(0.01)
+	during = []
+	while mover.is_alive():
+		t = time.monotonic()
+		moving = client.sensors()['moving']
+		client.screen(3)
+		during.append((time.monotonic() - t) * 1000)
+		if not moving:
+			break
+	mover.join()
+	print('index 2 spokes         %s in %.2fs, %d sensor+screen pairs answered meanwhile (p99 %.2fms)' % (
+		'ok' if done and done[0] else 'FAILED', time.monotonic() - start, len(during), percentile(during, 0.99)))
+	print('wheel                  %d half-steps, beam %s' % (
+		board.wheel.position, 'broken' if board.wheel.value() else 'clear'))
+	print('display                %r' % board.lcd.display)
+
+	# STOP cuts a move short
+	mover = threading.Thread(target=lambda: done.append(client.index(4)))
+	mover.start()
+	time.sleep(0.05)
+	client.stop()
+	mover.join()
+	print('index then stop        %s' % ('stopped' if not done[-1] else 'NOT stopped'))
+	client.close()
+	board.stop()
+
+	board, client = open_pair(noise=args.noise, seed=1)
+	lost = 0
+	for _ in range(args.count):
+		try:
+			client.ping()
+		except TimeoutError:
+			lost += 1
+	print('noise %.3f/byte        %d of %d requests resent, %d lost, %d bad frames dropped' % (
+		args.noise, client.retried, args.count, lost, board.firmware.reader.errors + client.reader.errors))
+	client.close()
+	board.stop()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,239 @@
+"""
+Plant model for the crusher: paddle wheel, break beams, can supply and ram.
+
+The wheel has four pockets, 90 degrees apart. Angles are measured within the
+current pocket, so a load turns the wheel from just past one spoke to the
+next:
+
+	0 ....... BEAM_START ===== BEAM_END (drop) ....... 90
+	|home beam|        safe_switch broken        |home beam|
+
+A pocket is filled from the hopper as it comes round to the top, breaks the
+safe_switch beam while it passes the throat and drops its can into the
+chamber at BEAM_END. The ram travels out while the crusher output is on and
+back while it is off; a can in the chamber is crushed when the ram reaches
+full extension. With reeds=True the plant also closes the controller's
+extended and retracted reed switches at the ends of the stroke. An
+intrusion (start, seconds) holds the safety beam broken for that long from
+start seconds after the plant starts, as a hand in the throat would.
+
+The tank is filled while the compressor output is on and each extend
+stroke draws it down. Stations sharing one compressor share one Tank, and a
+stroke that starts below FULL_CRUSH is counted as a low-pressure stroke.
+
+"""
+import random, threading, time
+
+POCKETS = 4
+HOME_WINDOW = 8		# degrees either side of a spoke that break the home beam
+BEAM_START = 35
+BEAM_END = 60
+RAM_EXTEND = 0.3	# seconds for a full stroke out
+RAM_RETRACT = 0.4	# seconds for the ram to clear the chamber after the valve drops
+TICK = 0.001		# real seconds between plant updates
+TANK_START = 90		# psi in the tank when a scenario starts
+TANK_MAX = 120		# psi at which the compressor's pressure switch cuts out
+TANK_FILL = 10		# psi per second of compressor time
+STROKE_DRAW = 20	# psi one extend stroke takes from the tank
+FULL_CRUSH = 60		# psi below which a stroke does not crush a can flat
+
+
+class ScaledClock:
+	# Simulated time that runs `scale` times faster than the wall clock
+	def __init__(self, scale=1.0):
+		self.scale = scale
+		self.real_start = time.monotonic()
+		self.epoch = time.time()
+
+	def monotonic(self):
+		return (time.monotonic() - self.real_start) * self.scale
+
+	def time(self):
+		return self.epoch + self.monotonic()
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			time.sleep(seconds / self.scale)
+
+	def install(self, controller):
+		# Point the controller's clock functions at simulated time
+		controller.sleep = self.sleep
+		controller.ti = self.time
+		controller.monotonic = self.monotonic
+		controller.telemetry.clock = self.monotonic
+		controller.inputs.clock = self.monotonic
+		controller.inputs.time_scale = self.scale
+
+
+class Tank:
+	def __init__(self, compressor, psi=TANK_START):
+		self.compressor = compressor	# the real output, not a station's claim on it
+		self.psi = psi
+		self.last = None
+		self.strokes = 0
+		self.low_strokes = 0
+		self.lowest = psi
+		self.lock = threading.Lock()
+
+	def update(self, now):
+		# Several plants step a shared tank; only time not yet counted fills it
+		with self.lock:
+			if self.last is not None and now > self.last and self.compressor.value:
+				self.psi = min(TANK_MAX, self.psi + TANK_FILL * (now - self.last))
+			if self.last is None or now > self.last:
+				self.last = now
+
+	def draw(self):
+		with self.lock:
+			self.strokes += 1
+			if self.psi < FULL_CRUSH:
+				self.low_strokes += 1
+			self.lowest = min(self.lowest, self.psi)
+			self.psi = max(0.0, self.psi - STROKE_DRAW)
+
+
+class Plant:
+	def __init__(self, controller, clock, cans=0, arrival_rate=0.0,
+			wheel_speed=45.0, jam_rate=0.0, jam_angle=45, reeds=False, intrusion=None,
+			tank=None, seed=None):
+		self.controller = controller
+		self.clock = clock
+		self.hopper = cans
+		self.arrival_rate = arrival_rate	# cans per minute added to the hopper
+		self.wheel_speed = wheel_speed		# degrees per second at full power
+		self.jam_rate = jam_rate		# chance that a pocket jams on its way round
+		self.jam_angle = jam_angle
+		self.random = random.Random(seed)
+		factory = controller.home_switch.pin_factory
+		self.home_pin = factory.pin(controller.pins['home'])
+		self.safe_pin = factory.pin(controller.pins['safety'])
+		self.reeds = reeds
+		if reeds:
+			self.extended_pin = factory.pin(controller.pins['extended'])
+			self.retracted_pin = factory.pin(controller.pins['retracted'])
+		if tank is None:
+			tank = Tank(controller.air.compressor if controller.air else controller.compressor)
+		self.tank = tank
+		self.extending = False
+		self.intrusion = intrusion
+		self.intruding = False
+		self.angle = HOME_WINDOW + 1.0
+		self.pockets = [False] * POCKETS
+		self.jam_pending = False
+		self.jammed = False
+		self.chamber = False
+		self.ram = 0.0		# 0 retracted, 1 fully extended
+		self.arrivals = 0.0
+		self.crushes = []
+		self.jams = []
+		self.recoveries = []
+		self.interlock_violations = 0
+		self.running = False
+		self.thread = None
+		self.fill_pocket()
+
+	def start(self):
+		self.running = True
+		self.last = self.started = self.clock.monotonic()
+		self.update_beams()
+		self.thread = threading.Thread(target=self.run, name='plant', daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.running = False
+		if self.thread:
+			self.thread.join()
+
+	def run(self):
+		while self.running:
+			time.sleep(TICK)
+			now = self.clock.monotonic()
+			self.step(now, now - self.last)
+			self.last = now
+
+	def pocket(self):
+		return int(self.angle // 90) % POCKETS
+
+	def phase(self):
+		return self.angle % 90
+
+	def fill_pocket(self):
+		if not self.pockets[self.pocket()] and self.hopper >= 1:
+			self.hopper -= 1
+			self.pockets[self.pocket()] = True
+		self.jam_pending = self.random.random() < self.jam_rate
+
+	def step(self, now, dt):
+		self.arrivals += self.arrival_rate * dt / 60
+		while self.arrivals >= 1:
+			self.arrivals -= 1
+			self.hopper += 1
+		self.tank.update(now)
+		self.step_ram(now, dt)
+		self.step_wheel(now, dt)
+		if self.intrusion is not None:
+			start, seconds = self.intrusion
+			self.intruding = 0 <= now - self.started - start < seconds
+		self.update_beams()
+
+	def step_ram(self, now, dt):
+		extending = bool(self.controller.crusher.value)
+		if extending and not self.extending:
+			self.tank.draw()
+		self.extending = extending
+		if extending:
+			self.ram = min(1.0, self.ram + dt / RAM_EXTEND)
+		else:
+			self.ram = max(0.0, self.ram - dt / RAM_RETRACT)
+		if self.ram >= 1.0 and self.chamber:
+			self.chamber = False
+			self.crushes.append(now)
+
+	def step_wheel(self, now, dt):
+		motor = self.controller.loader.value
+		if self.jammed:
+			# Backing the wheel off frees the can
+			if motor < 0:
+				self.jammed = False
+				self.jam_pending = False
+			return
+		before = self.phase()
+		pocket = self.pocket()
+		self.angle += motor * self.wheel_speed * dt
+		if self.pocket() != pocket:
+			if motor > 0:
+				self.fill_pocket()
+			return
+		after = self.phase()
+		if self.jam_pending and before < self.jam_angle <= after:
+			self.angle -= after - self.jam_angle
+			self.jammed = True
+			self.jams.append(now)
+		elif before < BEAM_END <= after and self.pockets[pocket]:
+			self.pockets[pocket] = False
+			self.chamber = True
+			if self.ram > 0:
+				self.interlock_violations += 1
+			if len(self.recoveries) < len(self.jams):
+				self.recoveries.append(now - self.jams[-1])
+
+	def update_beams(self):
+		phase = self.phase()
+		if phase < HOME_WINDOW or phase > 90 - HOME_WINDOW:
+			self.home_pin.drive_low()
+		else:
+			self.home_pin.drive_high()
+		if self.intruding or (self.pockets[self.pocket()] and BEAM_START <= phase < BEAM_END):
+			self.safe_pin.drive_low()
+		else:
+			self.safe_pin.drive_high()
+		if self.reeds:
+			self.drive(self.extended_pin, self.ram >= 1.0)
+			self.drive(self.retracted_pin, self.ram <= 0.0)
+
+	def drive(self, pin, closed):
+		# Reed switches pull their input low when closed
+		if closed:
+			pin.drive_low()
+		else:
+			pin.drive_high()
@@ -0,0 +1,49 @@
+import sys
+import types
+
+import pytest
+
+
+class FakeSMBus:
+    # Records every write as (kind, bytes on the wire after the address)
+    def __init__(self, number):
+        self.writes = []
+        self.registers = {}
+
+    def write_byte(self, addr, value):
+        self.writes.append(('byte', bytes([value])))
+
+    def write_i2c_block_data(self, addr, cmd, data):
+        self.writes.append(('block', bytes([cmd] + list(data))))
+
+    def read_byte(self, addr):
+        return 0
+
+    def read_i2c_block_data(self, addr, cmd, length):
+        return list(self.registers.get(cmd, bytes(length)))
+
+
+@pytest.fixture
+def pi(monkeypatch):
+    # smbus and RPi.GPIO only exist on the Pi
+    smbus = types.ModuleType('smbus')
+    smbus.SMBus = FakeSMBus
+    rpi = types.ModuleType('RPi')
+    gpio = types.ModuleType('RPi.GPIO')
+    gpio.RPI_REVISION = 3
+    rpi.GPIO = gpio
+    monkeypatch.setitem(sys.modules, 'smbus', smbus)
+    monkeypatch.setitem(sys.modules, 'RPi', rpi)
+    monkeypatch.setitem(sys.modules, 'RPi.GPIO', gpio)
+    for name in ('drivers.i2c_bus', 'drivers.i2c_dev', 'drivers.pressure'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+
+@pytest.fixture
+def lcd(pi):
+    from drivers import i2c_dev
+    lcd = i2c_dev.Lcd(addr=0x27)
+    lcd.smbus = lcd.lcd.bus.smbus
+    lcd.smbus.writes.clear()
+    return lcd
+
@@ -0,0 +1,37 @@
+import threading
+import time
+
+import pytest
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+from aircrusher import CrusherController
+
+
+@pytest.fixture
+def controller(tmp_path):
+    Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+    controller = CrusherController(journal_path=str(tmp_path / 'state.journal'), prom_path=None)
+    controller.sleep = lambda seconds: time.sleep(seconds / 50)
+    controller.init_hardware()
+    controller.display.start = lambda: None
+    controller.display.message = lambda *lines: None
+    controller.blink_error = lambda background=False: None
+    # Throat clear and a spoke in the home beam
+    Device.pin_factory.pin(controller.pins['safety']).drive_high()
+    Device.pin_factory.pin(controller.pins['home']).drive_high()
+    yield controller
+    controller.stop()
+    Device.pin_factory.reset()
+
+
+def test_beam_broken_during_boot_countdown_is_reported(controller):
+    def intrude():
+        time.sleep(0.1)
+        Device.pin_factory.pin(controller.pins['safety']).drive_low()
+    threading.Thread(target=intrude, daemon=True).start()
+    controller.start(boot_time=20)
+    assert controller.safety.tripped
+    assert controller.journal.state['safety_faults'] == 1
+    assert not controller.compressor.value
+    assert controller.button_edges is not None
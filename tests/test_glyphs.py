@@ -0,0 +1,15 @@
+def test_slot_set_back_before_upload_is_not_rewritten(lcd):
+    from drivers.glyphs import GlyphBank
+    bank = GlyphBank(lcd)
+    bank.define('full', ['11111'] * 8)
+    bank.define('empty', ['00000'] * 8)
+    bank.place(0, 'full')
+    bank.upload()
+    lcd.smbus.writes.clear()
+    bank.place(0, 'empty')
+    bank.place(0, 'full')
+    assert bank.pending == {}
+    bank.upload()
+    assert lcd.smbus.writes == []
+    assert bank.load('full') == [0]
+    assert lcd.smbus.writes == []
@@ -0,0 +1,30 @@
+import threading
+import time
+
+
+def test_streams_to_one_address_do_not_interleave(pi):
+    from drivers.i2c_bus import I2CBus, SENSOR
+    bus = I2CBus(1)
+    write = bus.smbus.write_i2c_block_data
+
+    def slow_write(addr, cmd, data):
+        write(addr, cmd, data)
+        time.sleep(0.002)
+    bus.smbus.write_i2c_block_data = slow_write
+
+    streams = [bytes([n]) * 102 for n in (1, 2, 3)]
+    threads = [threading.Thread(target=bus.write_stream, args=(0x27, stream)) for stream in streams]
+    for thread in threads:
+        thread.start()
+    # a sensor read still gets in between blocks
+    while not bus.smbus.writes:
+        time.sleep(0.0005)
+    with bus.hold(SENSOR):
+        bus.smbus.writes.append(('sensor', b''))
+    for thread in threads:
+        thread.join()
+
+    wire = b''.join(data for kind, data in bus.smbus.writes if kind != 'sensor')
+    assert sorted(wire[i:i + 102] for i in range(0, len(wire), 102)) == streams
+    kinds = [kind for kind, _ in bus.smbus.writes]
+    assert 0 < kinds.index('sensor') < len(kinds) - 1
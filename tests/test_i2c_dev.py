@@ -0,0 +1,39 @@
+# the bytes the per-byte lcd_write() path put on the wire for the same text
+def legacy_bytes(lcd, string, line):
+    from drivers.i2c_dev import LCD_LINES, Rs
+    lcd.smbus.writes.clear()
+    lcd.lcd_write(LCD_LINES[line])
+    for char in string:
+        lcd.lcd_write(ord(char), Rs)
+    assert all(kind == 'byte' for kind, _ in lcd.smbus.writes)
+    return b''.join(data for _, data in lcd.smbus.writes)
+
+
+# the (rs, byte) pairs an HD44780 latches on each falling edge of E
+def decode(stream):
+    from drivers.i2c_dev import En, Rs
+    nibbles = []
+    previous = 0
+    for value in stream:
+        if previous & En and not value & En:
+            nibbles.append((value & Rs, value & 0xF0))
+        previous = value
+    assert len(nibbles) % 2 == 0
+    return [(high[0], high[1] | low[1] >> 4) for high, low in zip(nibbles[::2], nibbles[1::2])]
+
+
+def test_line_is_four_block_transfers(lcd):
+    text = 'Cans crushed: 42'
+    lcd.lcd_display_string(text, 2)
+    writes = lcd.smbus.writes
+    assert [kind for kind, _ in writes] == ['block'] * 4
+    assert sum(len(data) for _, data in writes) == 102
+
+
+def test_stream_matches_per_byte_writes(lcd):
+    from drivers.i2c_dev import LCD_LINES, Rs
+    text = 'Cans crushed: 42'
+    lcd.lcd_display_string(text, 2)
+    stream = b''.join(data for _, data in lcd.smbus.writes)
+    assert stream == legacy_bytes(lcd, text, 2)
+    assert decode(stream) == [(0, LCD_LINES[2])] + [(Rs, ord(char)) for char in text]
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+from drivers.pico import PicoError
+from sim.pico import Adc, Lcd, Pin, Stepper, Wheel, firmware, open_pair
+
+link = firmware.link
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def pair():
+    board, client = open_pair()
+    yield board, client
+    client.close()
+    board.stop()
+
+
+def test_display_commands(pair):
+    board, client = pair
+    client.ping()
+    client.show('Cans: 3', 2)
+    assert board.lcd.display == [' ' * 16, 'Cans: 3'.ljust(16)]
+    client.define_screen(1, 'Loading', 'Wait')
+    client.screen(1)
+    assert board.lcd.display == ['Loading'.ljust(16), 'Wait'.ljust(16)]
+    with pytest.raises(PicoError):
+        client.screen(9)
+
+
+def test_index_turns_one_pocket_while_serving(pair):
+    board, client = pair
+    done = []
+    mover = threading.Thread(target=lambda: done.append(client.index(1)))
+    mover.start()
+    wait_for(lambda: board.wheel.position > board.wheel.width)
+    sensors = client.sensors()
+    assert sensors['moving'] and not sensors['beam']
+    with pytest.raises(PicoError):
+        client.index(1)
+    mover.join()
+    assert done == [True]
+    assert board.wheel.position == board.wheel.pocket
+    assert client.sensors() == {'beam': True, 'moving': False, 'pressure': 32768}
+
+
+def test_stop_ends_move(pair):
+    board, client = pair
+    done = []
+    mover = threading.Thread(target=lambda: done.append(client.index(2)))
+    mover.start()
+    wait_for(lambda: board.wheel.position > 0)
+    client.stop()
+    mover.join()
+    assert done == [False]
+    assert 0 < board.wheel.position < board.wheel.pocket
+
+
+
+def test_stop_before_move_starts():
+    # STOP lands after INDEX was accepted but before core 1 picks the move up
+    wheel = Wheel()
+    sent = []
+    stepper = Stepper.create(*wheel.coils, Pin(), wheel)
+    board = firmware.Firmware(None, types.SimpleNamespace(write=sent.append), stepper, Lcd(),
+                              wheel, Adc())
+
+    async def run():
+        board.dispatch(1, link.INDEX, link.struct.pack('<b', 1))
+        board.dispatch(2, link.STOP, b'')
+        threading.Thread(target=board.step_loop, daemon=True).start()
+        await board.move
+
+    asyncio.run(run())
+    replies = link.FrameReader().feed(b''.join(sent))
+    assert [(seq, payload[0]) for seq, _, payload in replies] == [(2, link.OK), (1, link.FAILED)]
+    assert wheel.position == 0
+
+
+def test_failed_move_prints_nothing_onto_the_link(capfd):
+    # On the Pico stdout is the link, so a spoke that never comes must stay quiet
+    wheel = Wheel(width=0)
+    sent = []
+    stepper = Stepper.create(*wheel.coils, Pin(), wheel)
+    board = firmware.Firmware(None, types.SimpleNamespace(write=sent.append), stepper, Lcd(),
+                              wheel, Adc())
+
+    async def run():
+        threading.Thread(target=board.step_loop, daemon=True).start()
+        board.dispatch(1, link.HOME, bytes((1,)))
+        await board.move
+
+    asyncio.run(run())
+    replies = link.FrameReader().feed(b''.join(sent))
+    assert [(seq, payload[0]) for seq, _, payload in replies] == [(1, link.FAILED)]
+    assert capfd.readouterr().out == ''
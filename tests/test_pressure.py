@@ -0,0 +1,19 @@
+def test_default_range_reaches_the_pressure_target(pi):
+    from aircrusher import CrusherController
+    from drivers.pressure import ADS1115_FULL_SCALE, PressureSensor
+    sensor = PressureSensor()
+    assert sensor.v_max < ADS1115_FULL_SCALE
+    assert sensor.v_max <= 3.3 + 0.3
+    assert sensor.max_readable_psi() > CrusherController(prom_path=None).pressure_target
+
+
+def test_read_psi(pi):
+    from drivers.pressure import ADS1115_CONVERSION, ADS1115_FULL_SCALE, PressureSensor
+    sensor = PressureSensor()
+    bus = sensor.adc.bus.smbus
+    # 3.0V at the pin is the transducer's 4.5V, its full 100 psi
+    raw = round(3.0 / ADS1115_FULL_SCALE * 32768)
+    bus.registers[ADS1115_CONVERSION] = bytes((raw >> 8, raw & 0xFF))
+    assert abs(sensor.read_psi() - 100) < 0.1
+    bus.registers[ADS1115_CONVERSION] = bytes(2)
+    assert sensor.read_psi() == 0.0
@@ -0,0 +1,32 @@
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+from aircrusher.stations import StationGroup, STATION_PINS
+
+
+def test_station_pins_are_distinct():
+    pins = [pin for station in STATION_PINS for pin in station.values()]
+    pins += list(StationGroup.PINS.values()) + [2, 3]  # and the LCD's i2c
+    assert len(pins) == len(set(pins))
+
+
+def test_stop_releases_air_and_supervisors(tmp_path):
+    Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+    try:
+        group = StationGroup(STATION_PINS, state_dir=str(tmp_path))
+        group.init_hardware()
+        group.display.message = lambda *lines: None
+        for station in group.stations:
+            station.compressor.on()
+        group.air.claim('group').on()
+        assert group.compressor.value
+        group.stop()
+        assert group.air.claims == set()
+        assert not group.compressor.value
+        assert not any(station.safety.running for station in group.stations)
+    finally:
+        Device.pin_factory.reset()
+
+
+def test_stop_before_hardware(tmp_path):
+    StationGroup(state_dir=str(tmp_path)).stop('Program Stop', 'by KBI')
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+
+class FakeClock:
+    # MicroPython's ticks functions on a virtual microsecond clock that only
+    # moves when the stepper sleeps
+    def __init__(self):
+        self.now = 0
+
+    def ticks_us(self):
+        return self.now
+
+    def ticks_ms(self):
+        return self.now // 1000
+
+    def ticks_add(self, ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(self, ticks1, ticks2):
+        return ticks1 - ticks2
+
+    def sleep_us(self, us):
+        self.now += us
+
+
+class FakePin:
+    def __init__(self, value=0):
+        self.level = value
+
+    def value(self, level=None):
+        if level is None:
+            return self.level
+        self.level = level
+
+    IRQ_RISING = 1
+
+    def irq(self, handler=None, trigger=None, hard=False):
+        pass
+
+
+@pytest.fixture
+def stepper(monkeypatch):
+    # crusher/Stepper.py is copied to the Pico's root, so it is imported bare
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(__file__), '..', 'crusher'))
+    import Stepper
+    clock = FakeClock()
+    writes = []
+
+    def coil(n):
+        return lambda level: writes.append((clock.now, n, level))
+
+    stepper = Stepper.create(coil(1), coil(2), coil(3), coil(4), FakePin(), FakePin(), clock=clock)
+    stepper.writes = writes
+    writes.clear()
+    return stepper
+
+
+# (time, levels) of each half-step energised, and the time the coils were released
+def half_steps(stepper):
+    writes = stepper.writes
+    steps = [(writes[i][0], [level for _, _, level in writes[i:i + 4]])
+             for i in range(0, len(writes) - 4, 4)]
+    return steps, writes[-4][0]
+
+
+def test_ramp_accelerates_to_max_speed(stepper):
+    ramp = stepper.build_ramp()
+    assert ramp[0] == int(1000000 / (1000 / stepper.delay))
+    assert all(a > b for a, b in zip(ramp, ramp[1:]))
+    assert ramp[-1] == int(1000000 / stepper.max_speed)
+
+
+def test_step_intervals_follow_ramp(stepper):
+    ramp = stepper.build_ramp()
+    count = 50
+    stepper.step(count)
+    steps, released = half_steps(stepper)
+    total = count * len(stepper.ROTATE)
+    assert len(steps) == total
+    assert [levels for _, levels in steps] == [stepper.ROTATE[i % 8] for i in range(total)]
+
+    times = [t for t, _ in steps] + [released]
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    accel = len(ramp) - 1
+    assert intervals[:accel] == ramp[:accel]
+    assert set(intervals[accel:-accel]) == {ramp[-1]}
+    assert intervals[-accel:] == ramp[:accel][::-1]
+
+
+def test_short_move_never_reaches_cruise(stepper):
+    ramp = stepper.build_ramp()
+    stepper.step(2)
+    steps, released = half_steps(stepper)
+    times = [t for t, _ in steps] + [released]
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    assert len(intervals) == 16 < 2 * len(ramp)
+    assert intervals == [ramp[min(i, 15 - i)] for i in range(16)]
+    assert ramp[-1] not in intervals
+
+
+def test_backwards_reverses_phases(stepper):
+    stepper.step(-1)
+    steps, _ = half_steps(stepper)
+    assert [levels for _, levels in steps] == stepper.ROTATE[::-1]
+    assert stepper.writes[-4:] == [(stepper.writes[-1][0], n, 0) for n in (1, 2, 3, 4)]
@@ -0,0 +1,25 @@
+from aircrusher.telemetry import Telemetry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_phases_and_rate_use_the_given_clock():
+    clock = FakeClock()
+    telemetry = Telemetry(clock=clock)
+    with telemetry.phase('extend'):
+        clock.now += 2.5
+    assert telemetry.samples['extend'][0] == 2.5
+
+    for _ in range(3):
+        telemetry.count_can()
+        clock.now += 25
+    assert telemetry.cans_per_minute() == 2
+    clock.now += 60
+    assert telemetry.cans_per_minute() == 0
+    assert telemetry.cans_total == 3